@@ -0,0 +1,189 @@
+import argparse
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from decimal import Decimal, localcontext
+from PIL import Image
+import mandelbrot
+from perturbation import decimal_digits
+
+# Render zoom animations, e.g. 300 frames zooming a thousandfold into a point of the seahorse
+# valley:
+#     python animate.py -2.5 1 1.25 -1.25 -0.743643887 0.131825904 1000 300 frames
+# Every frame is the start view shrunk around the target by a factor that grows
+# exponentially, so each frame lies inside the one before it. Instead of rendering every
+# frame, keyframes are rendered every time the zoom doubles, at `oversample` times the
+# resolution of a frame, and the frames are cut out of the keyframe they lie in and scaled
+# down to the size of a frame. Since a frame covers at least half of its keyframe, the
+# keyframe always has at least as many pixels across the frame as the frame itself. Frames
+# are written to numbered PNGs by a thread of their own, through a bounded queue.
+
+OVERSAMPLE = 2
+FRAME_QUEUE = 8
+# The frames waiting to be written at most, so that memory does not grow with the animation.
+WRITER_POLL = 0.5
+# The seconds between checks that the writer thread is still alive while the queue is full.
+NAIVE_SAMPLES = 5
+# The number of frames rendered directly to estimate the time rendering every frame would take.
+
+def frame_view(view, target, scale):
+# The view `view` (real_start, real_end, imag_end, imag_start) shrunk by `scale` around the
+# point `target` (real, imag).
+
+    real, imag = target
+
+    return [real + (view[0] - real) * scale, real + (view[1] - real) * scale,
+        imag + (view[2] - imag) * scale, imag + (view[3] - imag) * scale]
+
+def crop_box(frame, keyframe, width, height):
+# The box, in the pixels of a `width`-by-`height` image of `keyframe`, covered by `frame`.
+
+    real_span = keyframe[1] - keyframe[0]
+    imag_span = keyframe[2] - keyframe[3]
+
+    return (
+        float((frame[0] - keyframe[0]) / real_span) * width, float((frame[3] - keyframe[3]) / imag_span) * height,
+        float((frame[1] - keyframe[0]) / real_span) * width, float((frame[2] - keyframe[3]) / imag_span) * height
+        )
+    # The top row of the image is `imag_start`, as in `main.Mandelbrot.map_pixel`.
+
+def write_frames(frames, errors):
+# Run on the writer thread. Save the images put on the queue `frames` until `None` is. If
+# saving fails, the exception is appended to `errors` and the thread stops.
+
+    while True:
+        item = frames.get()
+        if item is None:
+            return
+        path, image = item
+        try:
+            image.save(path)
+        except Exception as error:
+            errors.append(error)
+            return
+
+def put_frame(frames, item, writer):
+# Put `item` on the queue `frames` once there is room, unless the thread `writer` taking
+# them off it has stopped. Returns whether it was put.
+
+    while writer.is_alive():
+        try:
+            frames.put(item, timeout = WRITER_POLL)
+            return True
+        except queue.Full:
+            pass
+
+    return False
+
+def animate(view, target, depth, frame_count, directory, height, bailout_radius, steps, mode, oversample = OVERSAMPLE, workers = None, report = None):
+# Render `frame_count` frames, `height` pixels tall, zooming from `view` (real_start,
+# real_end, imag_end, imag_start) into `target` (real, imag) until the view is `depth` times
+# smaller, into `directory/frame_00000.png` and so on. The coordinates may be `Decimal`s or
+# strings. `report` is called with each frame's number once it is queued. Returns the time
+# taken, the estimated time rendering every frame would have taken, and the number of
+# keyframes rendered. An error writing a frame stops the animation and is raised.
+
+    os.makedirs(directory, exist_ok = True)
+    view = [Decimal(i) for i in view]
+    target = [Decimal(i) for i in target]
+    zooms = math.log2(depth)
+    last_keyframe = math.floor(zooms)
+    width = int(abs(height * (view[1] - view[0]) / (view[2] - view[3])))
+    # As `mandelbrot.make_plane` computes it. Every frame has the shape of `view`, so every
+    # frame is this wide: computed from the rounded bounds of each frame, the width would
+    # flicker by a pixel between frames.
+
+    def scale(exponent):
+    # The scale of the view `exponent` doublings of the zoom in, with enough digits.
+
+        with localcontext() as context:
+            context.prec = decimal_digits((view[1] - view[0]) / Decimal(2) ** math.ceil(exponent))
+            return Decimal(2) ** Decimal(-exponent)
+
+    def precise_view(factor):
+
+        with localcontext() as context:
+            context.prec = decimal_digits((view[1] - view[0]) * factor)
+            return frame_view(view, target, factor)
+
+    frames = queue.Queue(FRAME_QUEUE)
+    errors = []
+    writer = threading.Thread(target = write_frames, args = (frames, errors))
+    writer.start()
+
+    start = time.perf_counter()
+    keyframe_index = None
+    keyframes = 0
+
+    try:
+        for number in range(frame_count):
+
+            exponent = zooms * number / max(frame_count - 1, 1)
+            index = min(math.floor(exponent + 1e-9), last_keyframe)
+
+            if index != keyframe_index:
+                keyframe_index = index
+                keyframe = precise_view(scale(index))
+                image, _ = mandelbrot.make_mandelbrot_set(*keyframe, round(height * oversample), bailout_radius, steps, mode, workers)
+                image = Image.fromarray(image)
+                keyframes += 1
+
+            frame = precise_view(scale(exponent))
+            box = crop_box(frame, keyframe, *image.size)
+            if not put_frame(frames, (os.path.join(directory, f'frame_{number:05}.png'), image.resize((width, height), Image.LANCZOS, box)), writer):
+                break
+
+            if report is not None:
+                report(number)
+
+    finally:
+        put_frame(frames, None, writer)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - start
+
+    samples = []
+    for number in sorted({round(i * (frame_count - 1) / max(NAIVE_SAMPLES - 1, 1)) for i in range(NAIVE_SAMPLES)}):
+        sample_start = time.perf_counter()
+        mandelbrot.make_mandelbrot_set(
+            *precise_view(scale(zooms * number / max(frame_count - 1, 1))), height, bailout_radius, steps, mode, workers)
+        samples.append(time.perf_counter() - sample_start)
+    # Rendering every frame is estimated from a few frames along the zoom.
+
+    return elapsed, sum(samples) / len(samples) * frame_count, keyframes
+
+def main(arguments = None):
+
+    parser = argparse.ArgumentParser(description = 'Render a Mandelbrot zoom animation to numbered PNGs.')
+    for name in ('real_start', 'real_end', 'imag_end', 'imag_start', 'target_real', 'target_imag'):
+        parser.add_argument(name)
+    parser.add_argument('depth', type = float, help = 'how many times smaller the last frame is than the first')
+    parser.add_argument('frames', type = int)
+    parser.add_argument('directory')
+    parser.add_argument('--height', type = int, default = 360)
+    parser.add_argument('--bailout-radius', type = int, default = 1024)
+    parser.add_argument('--steps', type = int, default = 512)
+    parser.add_argument('--mode', choices = mandelbrot.MODES, default = 'distance_estimator')
+    parser.add_argument('--oversample', type = float, default = OVERSAMPLE)
+    parser.add_argument('--workers', type = int, default = None, help = 'number of processes (default: every core)')
+    arguments = parser.parse_args(arguments)
+
+    elapsed, naive, keyframes = animate(
+        [arguments.real_start, arguments.real_end, arguments.imag_end, arguments.imag_start],
+        [arguments.target_real, arguments.target_imag], arguments.depth, arguments.frames,
+        arguments.directory, arguments.height, arguments.bailout_radius, arguments.steps,
+        arguments.mode, arguments.oversample, arguments.workers
+        )
+    print(f'{arguments.frames} frames from {keyframes} keyframes in {elapsed:.1f} s; '
+        f'rendering every frame would take about {naive:.1f} s ({naive / elapsed:.1f}x)')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
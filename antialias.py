@@ -0,0 +1,121 @@
+import numpy as np
+from mandelbrot import escape_hsv, hsv_to_rgb, in_cardioid_or_bulb, iterate_points, normalized_iteration
+
+# Adaptive anti-aliasing: https://en.wikipedia.org/wiki/Spatial_anti-aliasing
+# Rendering at a multiple of the height and scaling down costs the square of the multiple
+# in iterations everywhere, although only the pixels near the boundary of the set alias:
+# elsewhere neighbouring pixels have nearly the same colour anyway. Instead, the image is
+# rendered at its own resolution, the pixels whose escape data differs strongly from a
+# neighbour's are found, and only those are iterated again at `samples`-by-`samples` points
+# spread over the pixel, all in one batch. The colours of the points are averaged into the
+# pixel's. The cost grows with the length of the boundary rather than with the area.
+
+ANTIALIAS_SAMPLES = 3
+# Each pixel on the boundary is iterated again at `ANTIALIAS_SAMPLES` ^ 2 points.
+ANTIALIAS_THRESHOLD = 1
+# Neighbouring pixels whose smooth iteration counts differ by more than this are on the
+# boundary.
+
+def boundary_pixels(data, threshold = ANTIALIAS_THRESHOLD):
+# A matrix, the shape of the escape data `data`, that is `True` for the pixels that differ
+# strongly from one of their neighbours: one is in the set and the other is not, or their
+# smooth iteration counts (see `normalized_iteration`) differ by more than `threshold`.
+
+    smooth = np.where(data.interior, 0, normalized_iteration(data.iterations, np.where(data.interior, np.e ** 2, data.abs_z)))
+    boundary = np.zeros(data.interior.shape, dtype = bool)
+
+    for axis in (0, 1):
+
+        before = [slice(None)] * 2
+        after = [slice(None)] * 2
+        before[axis] = slice(None, -1)
+        after[axis] = slice(1, None)
+        before, after = tuple(before), tuple(after)
+
+        differs = np.logical_or(
+            data.interior[before] != data.interior[after],
+            np.abs(smooth[before] - smooth[after]) > threshold
+            )
+        boundary[before] |= differs
+        boundary[after] |= differs
+        # Both pixels of a pair that differs are on the boundary.
+
+    return boundary
+
+def sample_offsets(data, samples):
+# The offsets from the centre of a pixel of the `samples`-by-`samples` points spread evenly
+# over it, as complex numbers.
+
+    real_step = (data.real_axis[-1] - data.real_axis[0]) / max(data.width - 1, 1)
+    imag_step = (data.imag_axis[-1] - data.imag_axis[0]) / max(data.height - 1, 1)
+    fractions = (np.arange(samples) + 0.5) / samples - 0.5
+
+    real, imag = np.meshgrid(fractions * real_step, fractions * imag_step)
+
+    return (real + 1j * imag).ravel()
+
+def escape_samples(data, c, workers = 1, monitor = None):
+# The escape data of the points `c` (offsets from `data.centre` for deep zooms), iterated as
+# `data` was, as flat arrays.
+
+    size = c.size
+    iterations = np.full(size, data.steps, dtype = np.int64)
+    abs_z = np.full(size, np.e ** 2)
+    abs_dz = np.zeros(size, dtype = np.float64)
+    interior = np.ones(size, dtype = bool)
+    # As `escape_band` starts them.
+
+    if data.centre is not None:
+        import perturbation
+
+        orbit = perturbation.reference_orbit(*data.centre, data.bailout_radius, data.steps, monitor)
+        perturbation.escape_offsets(
+            c, orbit, float(np.abs(c).max(initial = 0)), data.bailout_radius, data.steps,
+            iterations, abs_z, abs_dz, interior, 1 if workers is None else workers, monitor
+            )
+
+    else:
+        index = np.flatnonzero(np.logical_not(in_cardioid_or_bulb(c)))
+        # Points of the main cardioid and the period-2 bulb are in the set without iterating them.
+        iterate_points(
+            index, c[index], np.copy(c[index]), np.zeros(index.size, dtype = np.complex128), 0,
+            data.steps, data.bailout_radius, iterations, abs_z, abs_dz, interior, monitor = monitor
+            )
+
+    return iterations, abs_z, abs_dz, interior
+
+def antialias_image(data, mode, image, samples = ANTIALIAS_SAMPLES, threshold = ANTIALIAS_THRESHOLD, workers = 1, monitor = None):
+# Anti-alias `image`, the image `colour_escape_data(data, mode)`, in place and return the
+# number of pixels iterated again. Each pixel on the boundary (see `boundary_pixels`) gets
+# the average of the colours of its samples, coloured as the image was: the distance
+# estimator is normalized by the largest distance of the image, so the samples match the
+# pixels around them.
+
+    rows, columns = np.nonzero(boundary_pixels(data, threshold))
+    count = rows.size
+
+    if count == 0:
+        return 0
+
+    offsets = sample_offsets(data, samples)
+    centres = data.real_axis[columns] + 1j * data.imag_axis[rows]
+    c = (centres[:, np.newaxis] + offsets[np.newaxis, :]).ravel()
+    # Every sample of every boundary pixel, one pixel after the other.
+
+    iterations, abs_z, abs_dz, interior = escape_samples(data, c, workers, monitor)
+    pixels = escape_hsv(iterations, abs_z, abs_dz, interior, data.steps, mode)
+
+    if mode == 'distance_estimator':
+        escaped = np.logical_not(data.interior)
+        distances = 2 * np.log(data.abs_z[escaped]) * data.abs_z[escaped] / data.abs_dz[escaped]
+        largest = np.amax(distances, initial = 0)
+        if largest > 0:
+            pixels[:, 0] = np.clip(pixels[:, 0] / largest, 0, 1)
+    # As `colour_escape_data` normalizes the image; a sample can lie further from the set than
+    # any pixel of the image.
+
+    colours = hsv_to_rgb(pixels).reshape(count, samples * samples, 3).mean(axis = 1)
+    np.flipud(image)[rows, columns] = (colours * 255).astype(np.uint8)
+    # The image is upside down compared with the escape data.
+
+    return count
@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import mandelbrot
+from render import read_views
+
+# Time the render engine over a matrix of views, colourings, heights and budgets, e.g.
+#     python benchmark.py --output results.json
+#     python benchmark.py --baseline results.json --threshold 0.1
+# Every case is rendered with `mandelbrot.make_mandelbrot_set` `--repeat` times and the
+# fastest wall time is kept, as it is the least disturbed by the rest of the machine. It is
+# then rendered once more under `tracemalloc` for its peak memory, which is left out of the
+# timing since tracing slows numpy's allocations down. The number of pixel-iterations of a
+# case comes from its escape data, so the rate does not depend on the colouring. The
+# results are written to JSON; compared with a baseline written the same way, every case
+# that got slower or bigger by more than the threshold is reported and the exit status is 1.
+# No window is opened, so it runs on a machine without a display.
+
+VIEWS = {
+    'full_set': ('-2.5', '1', '1.25', '-1.25'),
+    'seahorse_valley': ('-0.7575', '-0.7375', '0.1075', '0.0925'),
+    'cardioid_interior': ('-0.3', '-0.1', '0.075', '-0.075'),
+    }
+# real_start, real_end, imag_end, imag_start, as on a line of `images.txt`. The interior of
+# the cardioid never escapes, so every pixel takes the whole budget.
+SAMPLE_VIEW = 'sample'
+# The view of `images.txt` benchmarked along with `VIEWS`, when it is there.
+HEIGHTS = (200, 400)
+STEPS = (256, 1024)
+BAILOUT_RADIUS = 1024
+REPEAT = 3
+THRESHOLD = 0.1
+# The fraction by which a case may be slower or take more memory than the baseline before
+# it counts as a regression.
+
+def benchmark_views(path = 'images.txt'):
+# `VIEWS` along with the `SAMPLE_VIEW` of the `images.txt`-format file `path`, if it has one.
+
+    views = dict(VIEWS)
+
+    if os.path.exists(path):
+        for view in read_views(path):
+            if view['name'] == SAMPLE_VIEW:
+                views[SAMPLE_VIEW] = (view['real_start'], view['real_end'], view['imag_end'], view['imag_start'])
+
+    return views
+
+def pixel_iterations(data):
+# The number of iterations computed for every pixel of `data` together: a point that escapes
+# in iteration i took i + 1 of them and a point that never does took `steps`.
+
+    return int(np.sum(np.where(data.interior, data.steps, data.iterations + 1)))
+
+def run_case(bounds, height, steps, mode, workers = 1, kernel = 'complex', repeat = REPEAT):
+# The fastest of `repeat` renders of one case, in seconds, and the peak memory of one more,
+# in bytes.
+
+    arguments = (*bounds, height, BAILOUT_RADIUS, steps, mode, workers, kernel)
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        mandelbrot.make_mandelbrot_set(*arguments)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        mandelbrot.make_mandelbrot_set(*arguments)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Only allocations made through Python (which numpy's arrays are) are traced, so worker
+    # processes are not counted.
+
+    return min(times), peak
+
+def run_benchmark(views, modes = mandelbrot.MODES, heights = HEIGHTS, steps = STEPS, workers = 1, kernel = 'complex', repeat = REPEAT, report = None):
+# Run every combination of `views` (a dictionary of bounds by name), `modes`, `heights` and
+# `steps` and return the results as a JSON-ready dictionary. `report` is called with each
+# result as it is measured.
+
+    results = []
+
+    for name, bounds in views.items():
+        for height in heights:
+            for budget in steps:
+
+                data = mandelbrot.compute_escape_data(*bounds, height, BAILOUT_RADIUS, budget, workers, kernel = kernel)
+                count = pixel_iterations(data)
+                del data
+                # The same for every colouring, so it is counted once.
+
+                for mode in modes:
+
+                    seconds, peak = run_case(bounds, height, budget, mode, workers, kernel, repeat)
+                    result = {
+                        'view': name, 'mode': mode, 'height': height, 'steps': budget,
+                        'kernel': kernel, 'workers': workers,
+                        'seconds': seconds, 'pixel_iterations': count,
+                        'pixel_iterations_per_second': count / seconds, 'peak_bytes': peak
+                        }
+                    results.append(result)
+
+                    if report is not None:
+                        report(result)
+
+    return {
+        'environment': {
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'workers': workers, 'kernel': kernel, 'repeat': repeat
+            },
+        'results': results
+        }
+
+def case_key(result, environment = None):
+# What a result measured: the view, colouring, size, budget, kernel and number of workers.
+# Only results with the same key are compared. The kernel and workers of results written
+# before they were recorded per result come from `environment`.
+
+    environment = environment or {}
+
+    return (
+        result['view'], result['mode'], result['height'], result['steps'],
+        result.get('kernel', environment.get('kernel', 'complex')), result.get('workers', environment.get('workers', 1))
+        )
+
+def compare(results, baseline, threshold = THRESHOLD):
+# The regressions of `results` against `baseline` (both as returned by `run_benchmark`), as
+# lines of text. Cases missing from either are left out, as are cases run with another
+# kernel or number of workers.
+
+    baseline_results = {case_key(result, baseline.get('environment')): result for result in baseline['results']}
+    regressions = []
+
+    for result in results['results']:
+
+        base = baseline_results.get(case_key(result))
+        if base is None:
+            continue
+
+        for field, unit, scale in (('seconds', 's', 1), ('peak_bytes', 'MiB', 2 ** -20)):
+            if result[field] > base[field] * (1 + threshold):
+                regressions.append(
+                    '{} {} {}px {} steps {} kernel {} workers: {} {:.3f} {} -> {:.3f} {} ({:+.0%})'.format(
+                        *case_key(result), field, base[field] * scale, unit,
+                        result[field] * scale, unit, result[field] / base[field] - 1)
+                    )
+
+    return regressions
+
+def describe(result):
+
+    return (f"{result['view']} {result['mode']} {result['height']}px {result['steps']} steps: "
+        f"{result['seconds']:.3f} s, {result['pixel_iterations_per_second'] / 1e6:.1f} M pixel-iterations/s, "
+        f"{result['peak_bytes'] / 2 ** 20:.1f} MiB")
+
+def main(arguments = None):
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the Mandelbrot render engine.')
+    parser.add_argument('--output', help = 'JSON file to write the results to')
+    parser.add_argument('--baseline', help = 'JSON file written by an earlier run to compare with')
+    parser.add_argument('--threshold', type = float, default = THRESHOLD, help = 'fraction slower or bigger that counts as a regression')
+    parser.add_argument('--views', nargs = '+', help = 'names of the views to run (default: all)')
+    parser.add_argument('--modes', nargs = '+', choices = mandelbrot.MODES, default = mandelbrot.MODES)
+    parser.add_argument('--heights', nargs = '+', type = int, default = HEIGHTS)
+    parser.add_argument('--steps', nargs = '+', type = int, default = STEPS)
+    parser.add_argument('--repeat', type = int, default = REPEAT)
+    parser.add_argument('--workers', type = int, default = 1, help = 'number of processes (default: 1, for steady timings)')
+    parser.add_argument('--kernel', choices = mandelbrot.KERNELS, default = 'complex')
+    arguments = parser.parse_args(arguments)
+
+    views = benchmark_views()
+    if arguments.views:
+        unknown = set(arguments.views) - set(views)
+        if unknown:
+            parser.error(f"unknown views: {', '.join(sorted(unknown))} (known: {', '.join(views)})")
+        views = {name: views[name] for name in arguments.views}
+
+    results = run_benchmark(
+        views, arguments.modes, arguments.heights, arguments.steps, arguments.workers,
+        arguments.kernel, arguments.repeat, lambda result: print(describe(result), flush = True)
+        )
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent = 2)
+
+    if arguments.baseline:
+
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, arguments.threshold)
+
+        for line in regressions:
+            print(f'regression: {line}')
+        print(f'{len(regressions)} regressions against {arguments.baseline} (threshold {arguments.threshold:.0%})')
+        if not {case_key(result) for result in results['results']} & {case_key(result, baseline.get('environment')) for result in baseline['results']}:
+            print('no case of the baseline was run with the same view, size, kernel and workers to compare with')
+
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
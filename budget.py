@@ -0,0 +1,96 @@
+import math
+from decimal import Decimal
+import numpy as np
+from mandelbrot import compute_escape_data, continue_escape_data
+
+# Choose `steps` for a view automatically. Too small a budget leaves points that would have
+# escaped looking like points of the set (black speckle along the boundary), too large a one
+# spends iterations on nothing, and the budget a view needs grows as it zooms in. Instead of
+# guessing, the view is first rendered at `PROBE_HEIGHT` pixels, starting from a budget that
+# grows with the zoom depth. The number of points escaping shrinks by a roughly constant
+# ratio with every doubling of the budget, so the points escaping in the last two halvings
+# of the probe's budget estimate how many would escape after it (see `tail_estimate`); the
+# budget is doubled until that estimate is within half of `tolerance`. The budget chosen is
+# then the smallest power of two that leaves no more than `tolerance` of the points
+# unresolved: escaping at or after it, by the probe and the estimate.
+
+AUTO_STEPS_TOLERANCE = 0.002
+# The fraction of the points of the probe that may escape only after the budget chosen.
+PROBE_HEIGHT = 48
+MINIMUM_STEPS = 2 ** 6
+PROBE_STEPS = 2 ** 9
+# The budget the probe of the full set starts with. It doubles every `ZOOMS_PER_DOUBLING`
+# times the view halves in width, since deeper views need more iterations.
+ZOOMS_PER_DOUBLING = 8
+MAXIMUM_STEPS = 2 ** 18
+TAIL_DECAY = (0.5, 0.75)
+# The bounds of the ratio between the points escaping in one doubling of the budget and in
+# the next, so that a few points of a small probe do not make the estimate run away.
+FULL_SET_WIDTH = 3
+
+def zoom_depth(real_start, real_end):
+# The number of times the view from `real_start` to `real_end` (which may be `Decimal`s or
+# strings, as deep zooms need) has halved in width since the full set, or 0 if it is wider.
+
+    width = abs(Decimal(str(real_end)) - Decimal(str(real_start)))
+
+    if width == 0:
+        return 0
+
+    return max(0, math.log2(FULL_SET_WIDTH) - float(width.log10()) * math.log2(10))
+    # Through `log10`, which a `Decimal` too small for float64 still has.
+
+def probe_steps(depth):
+# The budget the probe of a view `depth` halvings deep starts with.
+
+    return min(MAXIMUM_STEPS, PROBE_STEPS << int(depth // ZOOMS_PER_DOUBLING))
+
+def unresolved(data, steps):
+# The fraction of the points of the escape data `data` that escaped in iteration `steps` or
+# later.
+
+    return np.count_nonzero(np.logical_and(np.logical_not(data.interior), data.iterations >= steps)) / data.interior.size
+
+def tail_estimate(data):
+# The fraction of the points of the escape data `data` estimated to escape after its budget,
+# from those that escaped in the last two halvings of it.
+
+    last = unresolved(data, data.steps // 2)
+    previous = unresolved(data, data.steps // 4) - last
+
+    if last == 0:
+        return 0
+
+    ratio = TAIL_DECAY[1] if previous == 0 else min(max(last / previous, TAIL_DECAY[0]), TAIL_DECAY[1])
+
+    return last * ratio / (1 - ratio)
+    # The sum of the points escaping in every doubling after the budget.
+
+def choose_steps(real_start, real_end, imag_start, imag_end, height, bailout_radius, tolerance = AUTO_STEPS_TOLERANCE, workers = 1, monitor = None):
+# The smallest power of two, from `MINIMUM_STEPS` to `MAXIMUM_STEPS`, that leaves no more
+# than `tolerance` of the points of a probe of the view unresolved. The arguments are those
+# of `compute_escape_data`. `monitor` may cancel the probe.
+
+    probe_height = min(int(height), PROBE_HEIGHT)
+    budget = probe_steps(zoom_depth(real_start, real_end))
+    data = compute_escape_data(
+        real_start, real_end, imag_start, imag_end, probe_height, bailout_radius, budget, workers,
+        True, True, monitor
+        )
+
+    while budget < MAXIMUM_STEPS and tail_estimate(data) > tolerance / 2:
+
+        budget *= 2
+        continued = continue_escape_data(data, budget, workers, monitor)
+        data = continued if continued is not None else compute_escape_data(
+            real_start, real_end, imag_start, imag_end, probe_height, bailout_radius, budget, workers,
+            True, True, monitor
+            )
+        # Deep zooms do not keep the state to continue from.
+
+    beyond = tail_estimate(data)
+    steps = MINIMUM_STEPS
+    while steps < budget and unresolved(data, steps) + beyond > tolerance:
+        steps *= 2
+
+    return steps
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from decimal import Decimal, localcontext
+from history import escape_data_nbytes
+from mandelbrot import ENGINE_VERSION
+from store import load_escape_data, save_escape_data
+
+CACHE_BUDGET = 256 * 2 ** 20
+# The number of bytes the escape data kept in memory may take up.
+CACHE_DIRECTORY = 'render_cache'
+DISK_BUDGET = 2 ** 30
+# The number of bytes the escape data kept on disk may take up.
+
+# Renders are cached by their parameters, so a view that was already rendered is not
+# iterated again. What is cached is the escape data rather than the image: every colouring
+# of a view shares one entry, and recolouring is cheap (see `colour_escape_data`). The
+# escape data of the most recently used views is kept in memory within `budget` bytes; with
+# a `directory`, it is also written there as `.npz` files (see `store.save_escape_data`)
+# that are kept within `disk_budget` bytes, least recently used first out, and survive
+# restarts.
+
+def canonical_bound(bound):
+# `bound` as a normalized decimal string, with every one of its digits: normalizing in the
+# default context would round deep zooms to 28 digits and give neighbouring views one key.
+
+    bound = Decimal(str(bound))
+
+    with localcontext() as context:
+        context.prec = max(context.prec, len(bound.as_tuple().digits))
+        return str(bound.normalize())
+
+def cache_key(bounds, height, bailout_radius, steps, variant = 'escape_time'):
+# The canonical key of a render: `bounds` (real_start, real_end, imag_end, imag_start) as
+# normalized decimal strings, so that `Decimal('-2')`, `-2.0` and `'-2.00'` are the same
+# view, and `variant`, the name of whatever else changes the escape data, such as the
+# algorithm or the kernel. `ENGINE_VERSION` is part of it, so files on disk written by an
+# older version of the engine are never read.
+
+    return (
+        tuple(canonical_bound(bound) for bound in bounds),
+        int(height), int(bailout_radius), int(steps), variant, ENGINE_VERSION
+        )
+
+class RenderCache:
+# The escape data of renders, by `cache_key`. Safe to use from several render threads.
+
+    def __init__(self, budget = CACHE_BUDGET, directory = None, disk_budget = DISK_BUDGET):
+
+        self.budget = budget
+        self.directory = directory
+        self.disk_budget = disk_budget
+        self.entries = OrderedDict()
+        # From least to most recently used.
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+    def path(self, key):
+
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode()).hexdigest() + '.npz')
+
+    def get(self, bounds, height, bailout_radius, steps, variant = 'escape_time'):
+    # The cached escape data of the render, or `None`. Escape data found on disk is kept in
+    # memory from then on.
+
+        key = cache_key(bounds, height, bailout_radius, steps, variant)
+
+        with self.lock:
+
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            if self.directory is not None and os.path.exists(self.path(key)):
+                try:
+                    data = load_escape_data(self.path(key))
+                except (OSError, ValueError, KeyError):
+                    data = None
+                # A file the cache was writing when it was interrupted is a miss.
+
+                if data is not None:
+                    os.utime(self.path(key))
+                    self.disk_hits += 1
+                    self.remember(key, data)
+                    return data
+
+            self.misses += 1
+            return None
+
+    def put(self, bounds, height, bailout_radius, steps, data, variant = 'escape_time'):
+    # Cache the escape data `data` of the render.
+
+        key = cache_key(bounds, height, bailout_radius, steps, variant)
+
+        with self.lock:
+
+            if key in self.entries:
+                self.nbytes -= escape_data_nbytes(self.entries.pop(key))
+
+            self.remember(key, data)
+
+            if self.directory is not None and not os.path.exists(self.path(key)):
+                temporary = self.path(key) + '.part'
+                save_escape_data(data, temporary)
+                os.replace(temporary, self.path(key))
+                self.fit_disk()
+
+    def remember(self, key, data):
+    # Keep `data` in memory as the most recently used entry and drop the least recently used
+    # ones until the entries fit `budget`. Escape data larger than `budget` is not kept.
+
+        nbytes = escape_data_nbytes(data)
+
+        if nbytes > self.budget:
+            return
+
+        self.entries[key] = data
+        self.nbytes += nbytes
+
+        while self.nbytes > self.budget:
+            _, dropped = self.entries.popitem(last = False)
+            self.nbytes -= escape_data_nbytes(dropped)
+
+    def fit_disk(self):
+    # Remove the least recently used files until the directory fits `disk_budget`.
+
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                status = os.stat(os.path.join(self.directory, name))
+                files.append((status.st_mtime, status.st_size, name))
+
+        total = sum(size for _, size, _ in files)
+
+        for _, size, name in sorted(files):
+            if total <= self.disk_budget:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+    # Forget the entries kept in memory; the files on disk stay.
+
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def statistics(self):
+    # The numbers of hits in memory and on disk, of misses and of entries in memory, and the
+    # bytes they take up.
+
+        with self.lock:
+            return {
+                'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'entries': len(self.entries), 'nbytes': self.nbytes
+                }
@@ -0,0 +1,144 @@
+import zlib
+import numpy as np
+
+HISTORY_BUDGET = 256 * 2 ** 20
+# The number of bytes the images and escape data kept in the history may take up.
+COMPRESSION_LEVEL = 1
+# zlib's fastest level; images of the set compress well even so.
+
+def escape_data_nbytes(data, counted = None):
+# The number of bytes taken up by the arrays of `data` and of the escape data it was cut
+# down from, which it keeps alive. Escape data whose `id` is in the set `counted` is left
+# out, and the escape data counted is added to it, so that escape data shared by several
+# entries is only counted once.
+
+    nbytes = 0
+
+    while data is not None:
+        if counted is not None:
+            if id(data) in counted:
+                break
+            counted.add(id(data))
+        for array in (data.iterations, data.abs_z, data.abs_dz, data.interior, data.active_index, data.active_z, data.active_dz):
+            if array is not None:
+                nbytes += array.nbytes
+        data = data.source
+
+    return nbytes
+
+class HistoryEntry:
+# A set in the history of the explorer. `view` holds its parameters in the order of
+# `main.Mandelbrot.current_view`. An entry is kept in one of three ways, from most to least
+# memory:
+#     decoded: the image and the escape data, so going back to it is instant and it can be
+#         recoloured without iterating;
+#     compressed: the image as zlib bytes, so going back to it only needs decompressing;
+#     coordinates: `view` alone, so going back to it needs rendering it again.
+
+    def __init__(self, view, image, escape_data):
+
+        self.view = list(view)
+        self.escape_data = escape_data
+        self.decoded = image
+        self.compressed = None
+        self.shape = None if image is None else image.shape
+
+    def image(self):
+    # The image of the set, or `None` if only its coordinates were kept.
+
+        if self.decoded is not None:
+            return self.decoded
+
+        if self.compressed is not None:
+            return np.frombuffer(zlib.decompress(self.compressed), dtype = np.uint8).reshape(self.shape)
+
+        return None
+
+    def nbytes(self, counted = None):
+    # See `escape_data_nbytes` for `counted`.
+
+        if self.decoded is not None:
+            return self.decoded.nbytes + escape_data_nbytes(self.escape_data, counted)
+
+        if self.compressed is not None:
+            return len(self.compressed)
+
+        return 0
+
+    def demote(self):
+    # Keep the entry in the next way down: a decoded entry is compressed and a compressed one
+    # forgets its image.
+
+        if self.decoded is not None:
+            self.compressed = zlib.compress(np.ascontiguousarray(self.decoded).tobytes(), COMPRESSION_LEVEL)
+            self.decoded = None
+            self.escape_data = None
+
+        else:
+            self.compressed = None
+
+class History:
+# The sets the explorer can go back (`previous`) and forward (`next`) to, the last element
+# of each being the closest. Whenever the entries take up more than `budget` bytes, every
+# entry but the closest on either side is compressed, furthest from the current set first,
+# and only if that is not enough are compressed entries reduced to their coordinates,
+# again furthest first, so that the closest ones stay decoded for instant Left and Right.
+
+    def __init__(self, budget = HISTORY_BUDGET):
+
+        self.budget = budget
+        self.previous = []
+        self.next = []
+
+    def nbytes(self):
+
+        counted = set()
+
+        return sum(entry.nbytes(counted) for entry in self.previous + self.next)
+
+    def push_previous(self, entry):
+
+        self.previous.append(entry)
+        self.fit()
+
+    def push_next(self, entry):
+
+        self.next.append(entry)
+        self.fit()
+
+    def pop_previous(self):
+
+        return self.previous.pop()
+
+    def pop_next(self):
+
+        return self.next.pop()
+
+    def clear_next(self):
+
+        self.next = []
+
+    def fit(self):
+    # Demote entries until the history fits `budget`: first the decoded entries but the
+    # closest on either side, then the compressed ones, each furthest from the current set
+    # first. If the closest entries alone are over `budget`, they are compressed and then
+    # reduced to their coordinates too.
+
+        entries = sorted(
+            ((len(stack) - position, entry) for stack in (self.previous, self.next) for position, entry in enumerate(stack)),
+            key = lambda distance_entry: distance_entry[0], reverse = True
+            )
+        closest = [stack[-1] for stack in (self.previous, self.next) if stack]
+
+        for demotable in (
+            lambda entry: entry.decoded is not None and not any(entry is other for other in closest),
+            lambda entry: entry.decoded is None and entry.compressed is not None,
+            lambda entry: entry.decoded is not None,
+            lambda entry: entry.compressed is not None,
+            ):
+            for _, entry in entries:
+                if self.nbytes() <= self.budget:
+                    return
+                if demotable(entry):
+                    entry.demote()
+        # Measured again after every demotion, since entries may share escape data.
@@ -1,6 +1,31 @@
+import time
+LAUNCHED = time.perf_counter()
+# Taken before the other imports, to measure the time from launch to the first set shown.
+import queue
+import threading
+from decimal import Decimal, localcontext
 from tkinter import *
 from PIL import Image, ImageTk
 from mandelbrot import *
+from history import History, HistoryEntry
+from perturbation import decimal_digits
+from store import ZoomStore
+from cache import RenderCache
+from budget import choose_steps
+
+RENDER_POLL = 50
+# How often, in milliseconds, the window checks on the render running in the background.
+PAN_FRACTION = 0.1
+# How far Shift and an arrow key move the view, as a fraction of its width or height.
+PAN_KEYS = {'Left': (1, 0), 'Right': (-1, 0), 'Up': (0, 1), 'Down': (0, -1)}
+# The direction each arrow key moves the image on the canvas, opposite to the view.
+SHIFT_MASK = 0x0001
+TRACE_PATH = 'render_trace.json'
+# Where the profile of the last render is written while renders are profiled.
+STARTUP_CACHE_DIRECTORY = 'startup_cache'
+STARTUP_CACHE_BUDGET = 64 * 2 ** 20
+# The set the program starts with is kept on disk so that later launches show it without
+# iterating it (see `show_first_set`).
 
 class Mandelbrot(Frame):
     def __init__(self, master):
@@ -13,36 +38,82 @@ class Mandelbrot(Frame):
         self.y = 0
         self.image = None
 
-        self.real_start = -2
-        self.real_end = 1
-        self.imag_start = -1
-        self.imag_end = 1
-        # Initialize the bounds for the image on the complex plane.
+        self.real_start = Decimal(-2)
+        self.real_end = Decimal(1)
+        self.imag_start = Decimal(-1)
+        self.imag_end = Decimal(1)
+        # Initialize the bounds for the image on the complex plane. The bounds are `Decimal`s so
+        # that they keep every digit of a deep zoom; float64 runs out after about a dozen zooms.
 
         self.bailout_radius = 2 **10
         self.steps = 2 ** 8
+        self.auto_steps = True
+        # Choose `steps` for every new zoom from a quick probe of it (see `budget`); Up and Down
+        # still override the choice. Toggled with `a`.
+        self.workers = None
+        # The number of processes to render with; `None` uses every core.
+        self.skip_interior = True
+        self.detect_cycles = True
+        # Skip the iteration of points known to be in the set (see `compute_escape_data`).
+        self.progressive = True
+        # Show coarse previews of a new set while it renders (see `progressive_escape`).
+        self.algorithm = 'escape_time'
+        # One of `ALGORITHMS`; 'subdivision' only iterates the borders of the parts of the set.
+        self.cache = RenderCache()
+        # The escape data of the sets rendered lately, so that going back to one of them does not
+        # iterate it again. Give it a directory (e.g. `cache.CACHE_DIRECTORY`) to keep them on
+        # disk between sessions as well.
+        self.profile_renders = False
+        # Record where the time of each render goes (see `RenderProfile`), show it in the
+        # status bar and write it to `TRACE_PATH`. Toggled with `p`.
+        self.startup_cache = RenderCache(0, STARTUP_CACHE_DIRECTORY, STARTUP_CACHE_BUDGET)
+        self.startup_key = None
+        self.first_frame = None
+        # The seconds from launch until the first set was shown, once it is.
 
-        self.mandelbrot = make_mandelbrot_set(self.real_start, self.real_end, self.imag_end, self.imag_start, self.height, self.bailout_radius, self.steps, 'distance_estimator')
-        # Generate the image.
+        self.mode = 'distance_estimator'
+        self.mandelbrot = None
+        self.escape_data = None
+        # The image and its escape data, set once the first render is done.
 
-        self.width = self.mandelbrot[1]
+        self.width = \
+            int(abs(self.height * (self.real_end - self.real_start) / (self.imag_start - self.imag_end)))
+        # The width of the image, as `make_plane` will compute it.
 
         self.canvas = Canvas(self, cursor = 'cross', width = self.width, height = self.height)
         # Initialize the canvas to hold the image.
 
-        self.config_set(self.mandelbrot[0])
-        # Set up the image to be displayed on the canvas.
-
         self.canvas.grid(row = 0, column = 0, sticky = N + S + E + W)
         # Display the image on the canvas.
 
+        self.status = Label(self, anchor = W)
+        self.status.grid(row = 1, column = 0, sticky = E + W)
+        # Shows the progress of the render running in the background.
+
+        self.pending = None
+        self.pending_pan = None
+        # How far the current set has been panned, while that is what is rendering.
+        self.preview_stride = None
+        # The stride of the preview on display while a set renders, if any.
+        self.results = queue.Queue()
+        # Renders run on a thread of their own so that the window never freezes. `pending` is
+        # the `RenderMonitor` of the render the window is waiting for, the parameters of the set
+        # it renders and whether the current set goes to the history once it is done;
+        # `results` carries finished renders back to the window.
+
+        self.show_first_set()
+        self.after(RENDER_POLL, self.poll_render)
+        # Generate the image.
+
         self.canvas.bind('<ButtonPress-1>', self.button_press)
         self.canvas.bind('<B1-Motion>', self.move)
         self.canvas.bind('<ButtonRelease-1>', self.button_release)
+        self.canvas.bind('<ButtonPress-3>', self.pan_press)
+        self.canvas.bind('<B3-Motion>', self.pan_move)
+        self.canvas.bind('<ButtonRelease-3>', self.pan_release)
         self.canvas.bind_all('<Key>', self.key_press)
         # Allow for the detection of key and button presses.
 
-        self.mode = 'distance_estimator'
         self.rectangle = None
         self.start_x = None
         self.start_y = None
@@ -52,20 +123,316 @@ class Mandelbrot(Frame):
         self.new_imag_end = None
         self.cursor_x = None
         self.cursor_y = None
-        self.previous_list = []
-        self.next_list = []
+        self.pan_start = None
+        self.pan_cursor = None
+        # Where the right-button drag that pans the view started and where it is now.
+        self.history = History()
+        # The sets to go back and forward to, kept within a memory budget (see `history`).
         self.task_running = False
         self.moving = False
-        self.saved_images = []
+        self.store = None
+        # The saved zooms (see `store`), opened the first time a zoom is saved or opened.
+
+    def current_view(self):
+    # The current set's parameters, in the order of `HistoryEntry.view`.
+
+        return [self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode]
+
+    def target_view(self):
+    # The parameters of the set being rendered, or of the current set if nothing is.
+
+        return list(self.pending[1]) if self.pending is not None else self.current_view()
+
+    def show_first_set(self):
+    # Show the set the program starts with: straight from `self.startup_cache` if an earlier
+    # launch rendered it with the same parameters and the same `ENGINE_VERSION`, or else by
+    # rendering it in the background, after which `render_view` caches it for the next launch.
+
+        view = self.current_view()
+        self.startup_key = (view[:4], self.height, self.bailout_radius, self.steps, self.algorithm)
+        escape_data = self.startup_cache.get(*self.startup_key)
+
+        if escape_data is None:
+            self.render_view(view, False)
+        else:
+            self.show_set(view, escape_data, False)
+
+    def render_view(self, view, push_history, reuse = None):
+    # Start rendering the set with the parameters `view` in the background, cancelling the
+    # render in progress, if any. If the set is the current one with a different `steps`, the
+    # escape data of the current set is continued or cut down instead of starting over.
+    # Otherwise `reuse(monitor)`, if given, may return escape data of the set made from that
+    # of the current one, which is used instead of rendering it from scratch. If `steps` of
+    # `view` is `None`, it is chosen by `choose_steps`, after the first preview of a
+    # progressive render or else before the render starts.
+
+        real_start, real_end, imag_end, imag_start, steps, bailout_radius, mode = view
+        escape_data = self.escape_data
+
+        if reuse is None and escape_data is not None and view[:4] == self.current_view()[:4] and bailout_radius == self.bailout_radius:
+            reuse = lambda monitor: continue_escape_data(escape_data, view[4], self.workers, monitor)
+
+        def escape(monitor, steps):
+
+            if reuse is not None:
+                result = reuse(monitor)
+                if result is not None:
+                    return result
+
+            def preview(stride, data):
+                self.results.put((monitor, 'preview', (stride, colour_preview(data, stride, view[6]))))
+            # Coloured here, off the window's thread, with the mode the set is to be shown in.
+
+            return compute_escape_data(real_start, real_end, imag_end, imag_start, self.height, bailout_radius, steps, self.workers, self.skip_interior, self.detect_cycles, monitor, preview if self.progressive else None, self.algorithm)
+
+        def compute(monitor):
+
+            def choose():
+                start = time.perf_counter()
+                view[4] = choose_steps(real_start, real_end, imag_end, imag_start, self.height, bailout_radius, workers = self.workers, monitor = monitor)
+                if monitor.profile is not None:
+                    monitor.profile.add('probe', time.perf_counter() - start)
+                return view[4]
+
+            if view[4] is None and (reuse is not None or not self.progressive):
+                choose()
+            # Probed here, off the window's thread; the set is shown with the budget chosen. A
+            # progressive render probes once its first pass is on display instead, and then
+            # continues it to the budget chosen.
+
+            key = (view[:4], self.height, bailout_radius, view[4], self.algorithm)
+            # The set's entry in `self.cache`, which every colouring of it shares.
+            result = None if view[4] is None else self.cache.get(*key)
+
+            if result is None:
+                result = escape(monitor, choose if view[4] is None else view[4])
+                key = (view[:4], self.height, bailout_radius, view[4], self.algorithm)
+                self.cache.put(*key[:4], result, key[4])
+
+                if key == self.startup_key:
+                    self.startup_cache.put(*key[:4], result, key[4])
+
+            return result
+
+        self.cancel_render()
+        monitor = RenderMonitor(RenderProfile() if self.profile_renders else None)
+        self.pending = (monitor, view, push_history)
+        self.pending_pan = None
+        threading.Thread(target = self.run_render, args = (monitor, compute), daemon = True).start()
+        self.canvas.config(cursor = 'watch')
+
+    def run_render(self, monitor, compute):
+    # Run on the render's thread. Hand the escape data, or the error raised, to the window.
+
+        try:
+            start = time.perf_counter()
+            escape_data = compute(monitor)
+            if monitor.profile is not None:
+                monitor.profile.add('escape', time.perf_counter() - start)
+            self.results.put((monitor, 'done', escape_data))
+
+        except RenderCancelled:
+            pass
+
+        except Exception as error:
+            self.results.put((monitor, 'error', error))
+
+    def cancel_render(self):
+    # Cancel the render in progress, if any. It stops within one iteration.
+
+        if self.pending is not None:
+            self.pending[0].cancel()
+            self.pending = None
+            self.canvas.config(cursor = 'cross')
+            self.status.config(text = '')
+
+            if self.preview_stride is not None and self.mandelbrot is not None:
+                self.config_set(self.mandelbrot[0])
+            # Put the current set back in place of the preview of the cancelled render.
+
+            self.preview_stride = None
+
+    def poll_render(self):
+    # Run every `RENDER_POLL` milliseconds. Display the render the window is waiting for once
+    # it is done and show its progress until then. Results of cancelled renders are dropped.
+
+        while not self.results.empty():
+            monitor, kind, value = self.results.get()
+
+            if self.pending is None or monitor is not self.pending[0]:
+                continue
+
+            if kind == 'preview':
+                self.preview_stride, pixels = value
+                self.photo_image = ImageTk.PhotoImage(Image.fromarray(pixels))
+                self.canvas.create_image(0, 0, anchor = 'nw', image = self.photo_image)
+                # Only displayed: `self.image` stays the current set until the new one is done.
+                continue
+
+            view, push_history = self.pending[1:]
+            self.pending = None
+            self.preview_stride = None
+            self.canvas.config(cursor = 'cross')
+            self.status.config(text = '')
+
+            if kind == 'done':
+                self.show_set(view, value, push_history, monitor.profile)
+            elif not isinstance(value, ArithmeticError):
+                self.status.config(text = f'Render failed: {value}')
+            # A zoom too small to have a width (zero division) is simply not displayed.
+
+        if self.pending is not None:
+            text = f'Rendering {self.pending[0].progress:.0%}'
+            if self.preview_stride is not None:
+                text += f' (showing a 1/{self.preview_stride} preview)' if self.preview_stride > 1 else ' (showing a preview)'
+            self.status.config(text = text)
+
+        self.after(RENDER_POLL, self.poll_render)
+
+    def show_set(self, view, escape_data, push_history, profile = None):
+    # Display a finished render of the set with the parameters `view`. If the render was
+    # profiled, its profile is shown in the status bar and written to `TRACE_PATH`.
+
+        if push_history:
+            self.history.push_previous(
+                self.history_entry()
+                )
+            # Add the current set's information to the history in case the user wants to go back.
+
+            self.history.clear_next()
+            # There should not be anything on which to zoom back in once a new zoom is complete.
+
+        self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode = view
+        self.escape_data = escape_data
+        self.mandelbrot = [colour_escape_data(self.escape_data, self.mode, profile), self.escape_data.width]
+        self.width = self.mandelbrot[1]
+        start = time.perf_counter()
+        self.config_set(self.mandelbrot[0])
+        self.mandelbrot[0] = np.array(self.image)
+
+        if self.first_frame is None:
+            self.first_frame = time.perf_counter() - LAUNCHED
+            self.status.config(text = f'First set shown {self.first_frame:.2f} s after launch')
+
+        if profile is not None:
+            profile.add('display', time.perf_counter() - start)
+            self.status.config(text = profile.summary())
+            profile.write(TRACE_PATH)
+
+    def change_steps(self, up):
+    # Double (or halve) `steps` of the set being displayed or rendered. The points of the
+    # current set that had not yet exceeded `self.bailout_radius` continue from where they
+    # stopped instead of starting again from z = c, and a smaller `steps` is cut down from
+    # the escape data already computed.
+
+        push_history = self.pending is not None and self.pending[2]
+        view = self.target_view()
+        if view[4] is None:
+            view[4] = self.steps
+        # The budget of a zoom still being probed for one is taken to be the current set's.
+        view[4] = view[4] << 1 if up else view[4] >> 1
+        self.render_view(view, push_history)
+
+    def pan(self, x, y):
+    # Move the image on the canvas by `x` and `y` pixels (the view moves the other way). The
+    # escape data of the part still in view is kept and only the strips that come into view
+    # are iterated. Pans made while the last one renders add up to one pan of the current set,
+    # and a pan made while another set renders moves that set instead.
+
+        if self.mandelbrot is None:
+            return
+
+        image = self.mandelbrot[0]
+        height, width = image.shape[:2]
+        x, y = int(x), int(y)
+
+        if x == 0 and y == 0:
+            return
+
+        pending_pan = self.pending_pan if self.pending is not None else None
+        panning_current = self.pending is None or pending_pan is not None
+        if pending_pan is not None:
+            x += pending_pan[0]
+            y += pending_pan[1]
+
+            if x == 0 and y == 0:
+                self.cancel_render()
+                return
+            # Panned back to the current set.
+
+        view = self.current_view() if panning_current else self.target_view()
+        if not panning_current:
+            width = int(abs(height * (view[1] - view[0]) / (view[2] - view[3])))
+        # As `mandelbrot.make_plane` computes it.
+
+        with localcontext() as context:
+            context.prec = decimal_digits(view[2] - view[3])
+            real_step = (view[1] - view[0]) / max(width - 1, 1)
+            imag_step = (view[3] - view[2]) / max(height - 1, 1)
+            view[0] -= x * real_step
+            view[1] -= x * real_step
+            view[2] += y * imag_step
+            view[3] += y * imag_step
+        # Pixel (i, j) of the complex plane becomes pixel (i + y, j - x); the top row of the
+        # canvas is the last row of the plane.
+
+        if not panning_current:
+            self.render_view(view, self.pending[2])
+            return
+        # Nothing of the set being rendered is on display yet to keep.
+
+        escape_data = self.escape_data
+        reuse = None
+        if escape_data is not None and abs(x) < width and abs(y) < height:
+            reuse = lambda monitor: pan_escape_data(escape_data, y, -x, self.workers, monitor)
+
+        self.render_view(view, True, reuse)
+        self.pending_pan = (x, y)
+
+        shifted = np.zeros_like(image)
+        shifted[max(y, 0):height + min(y, 0), max(x, 0):width + min(x, 0)] = \
+            image[max(-y, 0):height + min(-y, 0), max(-x, 0):width + min(-x, 0)]
+        self.preview_stride = 1
+        self.photo_image = ImageTk.PhotoImage(Image.fromarray(shifted))
+        self.canvas.create_image(0, 0, anchor = 'nw', image = self.photo_image)
+        # Show the part still in view in its new place straight away.
+
+    def history_entry(self):
+    # The current set's information, for `self.history`.
+
+        return HistoryEntry(self.current_view(), None if self.mandelbrot is None else self.mandelbrot[0], self.escape_data)
+
+    def restore(self, entry):
+    # Make the set of the history entry `entry` the current one. If the history only kept its
+    # coordinates, it is rendered again.
+
+        self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode = entry.view
+        self.escape_data = entry.escape_data
+        image = entry.image()
+
+        if image is None:
+            self.mandelbrot = None
+            self.image = None
+            self.canvas.delete('all')
+            self.render_view(entry.view, False)
+
+        else:
+            self.width = image.shape[1]
+            self.config_set(image)
+            self.mandelbrot = [np.array(self.image), self.width]
 
     def map_pixel(self, x, y):
     # Map a pixel to its corresponding complex number based on the width and height of the image 
     # and the complex bounds on the plane.
 
-        real_part = \
-            self.real_start + (x / self.width) * (self.real_end - self.real_start)
-        imag_part = \
-            self.imag_start + (y / self.height) * (self.imag_end - self.imag_start)
+        with localcontext() as context:
+            context.prec = decimal_digits(self.imag_end - self.imag_start)
+            # Enough digits to tell apart the pixels of the current zoom.
+
+            real_part = \
+                self.real_start + (Decimal(x) / self.width) * (self.real_end - self.real_start)
+            imag_part = \
+                self.imag_start + (Decimal(y) / self.height) * (self.imag_end - self.imag_start)
         return real_part, imag_part
     
     def generate_new_set(self, coordinates):
@@ -102,23 +469,26 @@ class Mandelbrot(Frame):
         # call relies on the value of `self.real_start` etc. to properly map the pixel.
 
         try:
-            self.mandelbrot = \
-                make_mandelbrot_set(self.new_real_start, self.new_real_end, self.new_imag_end, self.new_imag_start, self.height, self.bailout_radius, self.steps, self.mode)
+            width = \
+                int(abs(self.height * (self.new_real_end - self.new_real_start) / (self.new_imag_start - self.new_imag_end)))
+
+        except ArithmeticError:
+            width = 0
 
-        except ZeroDivisionError:
+        if width == 0:
             self.canvas.delete(self.rectangle)
             self.rectangle = None
             return 0
-        # If the `make_mandelbrot_set` call results in zero division (specifically when `width` is initialized)
-        # then do not generate a new set, otherwise generate the new set.
+        # If the new set has no width (or computing it results in zero division) then do not
+        # generate a new set, otherwise generate the new set.
 
-        self.real_start, self.imag_start = self.new_real_start, self.new_imag_start
-        self.real_end, self.imag_end = self.new_real_end, self.new_imag_end
+        view = [self.new_real_start, self.new_real_end, self.new_imag_end, self.new_imag_start] + self.target_view()[4:]
+        if self.auto_steps:
+            view[4] = None
+        # Let `render_view` choose the budget of the new zoom.
 
-        self.width = self.mandelbrot[1]
-
-        self.config_set(self.mandelbrot[0])
-        # Display the newly-generated set.
+        self.render_view(view, True)
+        # Render the newly-zoomed set in the background; it is displayed once it is done.
 
     def config_set(self, pixels):
     # From a three-dimensional array of RGB values display the image to the window.
@@ -168,16 +538,9 @@ class Mandelbrot(Frame):
             self.moving = False
             self.task_running = True
 
-            self.previous_list.append(
-                [self.mandelbrot[0], self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode]
-                )
-            # Append the current set's information to a list in case the user wants to go back.
-
             self.generate_new_set(self.canvas.coords(self.rectangle))
-            # Generate the new set
-
-            self.next_list = []
-            # There should not be anything on which to zoom back in once a new zoom is complete.
+            # Generate the new set, cancelling the render in progress, if any. The current set
+            # goes to the history once the new one is displayed.
 
             self.canvas.delete(self.rectangle)
             self.rectangle = None
@@ -185,6 +548,27 @@ class Mandelbrot(Frame):
 
             self.task_running = False
 
+    def pan_press(self, event):
+    # Start panning with the right button.
+
+        if not self.task_running:
+            self.pan_start = self.pan_cursor = (event.x, event.y)
+
+    def pan_move(self, event):
+    # Drag the image along with the cursor while panning.
+
+        if self.pan_cursor is not None:
+            self.canvas.move('all', event.x - self.pan_cursor[0], event.y - self.pan_cursor[1])
+            self.pan_cursor = (event.x, event.y)
+
+    def pan_release(self, event):
+    # Pan the view by however far the image was dragged.
+
+        if self.pan_start is not None:
+            self.canvas.move('all', self.pan_start[0] - self.pan_cursor[0], self.pan_start[1] - self.pan_cursor[1])
+            self.pan(event.x - self.pan_start[0], event.y - self.pan_start[1])
+            self.pan_start = self.pan_cursor = None
+
     def key_press(self, event):
     # Detect a key press.
 
@@ -192,67 +576,57 @@ class Mandelbrot(Frame):
 
             self.task_running = True
 
-            if event.keysym == 'Left':
+            if event.keysym in PAN_KEYS and event.state & SHIFT_MASK:
+            # If the user wants to pan the view with Shift and an arrow key.
+
+                x, y = PAN_KEYS[event.keysym]
+                self.pan(x * round(PAN_FRACTION * self.width), y * round(PAN_FRACTION * self.height))
+
+            elif event.keysym == 'Left':
             # If the user wants to go to the previous image.
 
-                if self.previous_list != []:
+                self.cancel_render()
+
+                if self.history.previous != []:
                 # If the current image is not the original.
 
-                    self.next_list.append(
-                        [self.mandelbrot[0], self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode]
+                    entry = self.history.pop_previous()
+                    self.history.push_next(
+                        self.history_entry()
                         )
-                    # Append the current image to `next_list` so that the user can go zoom back in to it.
-
-                    self.real_start, self.real_end, self.imag_end, self.imag_start = \
-                        self.previous_list[-1][1:5]
-                    self.steps = self.previous_list[-1][5]
-                    self.bailout_radius = self.previous_list[-1][6]
-                    self.mode = self.previous_list[-1][7]
-                    self.config_set(self.previous_list[-1][0])
-                    # Display the previous image.
+                    # Add the current image to the history so that the user can go zoom back in to it.
 
-                    del self.previous_list[-1]
-                    self.mandelbrot[0] = np.array(self.image)
+                    self.restore(entry)
+                    # Display the previous image.
             
             elif event.keysym == 'Right':
             # If the user wants to go to the previously-zoomed-into image.
 
-                if self.next_list != []:
+                self.cancel_render()
+
+                if self.history.next != []:
                 # If the user has gone to a previously-viewed image.
 
-                    self.previous_list.append(
-                        [self.mandelbrot[0], self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode]
+                    entry = self.history.pop_next()
+                    self.history.push_previous(
+                        self.history_entry()
                         )
-                    # Append the current image to `previous_list` so that the user can go back to it.
-
-                    self.real_start, self.real_end, self.imag_end, self.imag_start = \
-                        self.next_list[-1][1:5]
-                    self.steps = self.next_list[-1][5]
-                    self.bailout_radius = self.next_list[-1][6]
-                    self.mode = self.next_list[-1][7]
-                    self.config_set(self.next_list[-1][0])
-                    # Zoom back in to the image.
+                    # Add the current image to the history so that the user can go back to it.
 
-                    del self.next_list[-1]
-                    self.mandelbrot[0] = np.array(self.image)
+                    self.restore(entry)
+                    # Zoom back in to the image.
 
             elif event.keysym == 'Up': 
             # If the user wants to double the quality of the image (double `steps`), do just that and 
             # update the image. Render time is longer.
 
-                self.steps <<= 1
-                self.mandelbrot = \
-                    make_mandelbrot_set(self.real_start, self.real_end, self.imag_end, self.imag_start, self.height, self.bailout_radius, self.steps, self.mode)
-                self.config_set(self.mandelbrot[0])
+                self.change_steps(True)
 
             elif event.keysym == 'Down': 
             # If the user wants to halve the quality of the image (halve `steps`), do just that and update 
             # the image. Render time is shorter.
 
-                self.steps >>= 1
-                self.mandelbrot = \
-                    make_mandelbrot_set(self.real_start, self.real_end, self.imag_end, self.imag_start, self.height, self.bailout_radius, self.steps, self.mode)
-                self.config_set(self.mandelbrot[0])
+                self.change_steps(False)
 
             elif event.keysym == 'c':
                 self.change_mode('classic')
@@ -266,7 +640,19 @@ class Mandelbrot(Frame):
             elif event.keysym == 'd':
                 self.change_mode('distance_estimator')
 
-            elif event.keysym == 's':
+            elif event.keysym == 'a':
+            # If the user wants new zooms to choose their own `steps`, or to keep the current one.
+
+                self.auto_steps = not self.auto_steps
+                self.status.config(text = f"Automatic steps {'on' if self.auto_steps else 'off'}")
+
+            elif event.keysym == 'p':
+            # If the user wants to see where the time of each render goes, or no longer.
+
+                self.profile_renders = not self.profile_renders
+                self.status.config(text = f"Profiling renders {'on' if self.profile_renders else 'off'}")
+
+            elif event.keysym == 's' and self.image is not None:
             # If the user wants to save the image, let the user choose the name and add the image's 
             # relevant information to `images.txt`.
 
@@ -312,14 +698,25 @@ class Mandelbrot(Frame):
     def change_mode(self, mode):
     # If the user wants to change the colouring, call this function.
 
-        if self.mode != mode:
+        if self.pending is not None:
+            self.pending[1][6] = mode
+            # The set being rendered is coloured with `mode` once it is done.
+
+        elif self.mode != mode and self.escape_data is None:
+            view = self.current_view()
+            view[6] = mode
+            self.render_view(view, True)
+            # The history kept the image of the current set but not its escape data.
+
+        elif self.mode != mode:
 
-            self.previous_list.append(
-                [self.mandelbrot[0], self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode]
+            self.history.push_previous(
+                self.history_entry()
                 )
             self.mode = mode
-            self.mandelbrot = \
-                make_mandelbrot_set(self.real_start, self.real_end, self.imag_end, self.imag_start, self.height, self.bailout_radius, self.steps, self.mode)
+            self.mandelbrot[0] = colour_escape_data(self.escape_data, self.mode)
+            # Only the colouring changes, so the escape data of the current set is recoloured
+            # instead of being iterated again.
             self.config_set(self.mandelbrot[0])
             self.mandelbrot[0] = np.array(self.image)
 
@@ -329,6 +726,13 @@ class Mandelbrot(Frame):
         self.open_window.destroy()
         self.task_running = False
 
+    def zoom_store(self):
+
+        if self.store is None:
+            self.store = ZoomStore()
+
+        return self.store
+
     def save_image(self):
     # If the user wants to save the current image, call this function. Prompt the user to
     # choose a name for the file and write appropriate information to `images.txt`. 
@@ -336,6 +740,8 @@ class Mandelbrot(Frame):
         name = self.save_entry.get().replace(' ', '_')
         self.images_txt.write(f'{name} {self.real_start} {self.real_end} {self.imag_end} {self.imag_start} {self.height} {self.bailout_radius} {self.steps} {self.mode}\n') 
         self.image.save(f'images/{name}.png')
+        self.zoom_store().save(name, self.current_view(), self.height, self.escape_data)
+        # Keep the escape data as well, so opening the zoom again needs no iteration.
         self.images_txt.close()
         self.save_window.destroy()
         self.task_running = False
@@ -344,45 +750,35 @@ class Mandelbrot(Frame):
     def open_set(self):
     # If the user wants to open a previously-saved image, call this function. Prompt the user
     # to enter the name of the image they want to open, and see if it exists. If it does not,
-    # tell the user to try again. If it does, get the relevant information from `images.txt`
-    # and display the image.
+    # tell the user to try again. If it does, load its escape data from the zoom store and
+    # display the image, or render it if the store has no escape data for it.
 
-        self.images_txt = open('images.txt', 'a+')
-        self.images_txt.seek(0)
+        store = self.zoom_store()
         self.set_name = self.entry.get().replace(' ', '_')
-        
-        if not self.set_name in [i[0] for i in self.saved_images]:
-            self.saved_images = [i.split() for i in self.images_txt.readlines()]
+        record = store.find(self.set_name)
+
+        if record is None:
+            store.import_text()
+            record = store.find(self.set_name)
+        # Zooms only saved to `images.txt` are added to the store the first time they are looked for.
 
-        if not self.set_name in [i[0] for i in self.saved_images]:
+        if record is None:
             self.error_message = Label(self.open_window, text = 'Not found. Try again or exit.')
             self.error_message.grid(row = 1, column = 1, columnspan = 1, sticky = SW)
             self.error_message.configure(fg = 'red')
 
         else:
 
-            for i, j in enumerate(self.saved_images):
-                if self.set_name == j[0]:
-                    index = i
-                    break
-
-            self.previous_list.append(
-                [self.mandelbrot[0], self.real_start, self.real_end, self.imag_end, self.imag_start, self.steps, self.bailout_radius, self.mode]
-                )
-
-            self.mandelbrot = \
-                    make_mandelbrot_set(*self.saved_images[index][1:])
-
-            self.real_start, self.real_end, self.imag_end, self.imag_start = \
-                        [float(i) for i in self.saved_images[index][1:5]]
+            view, height = record
+            escape_data = store.load(self.set_name) if height == self.height else None
 
-            self.steps = int(self.saved_images[index][7])
-            self.bailout_radius = int(self.saved_images[index][6])
-            self.mode = self.saved_images[index][8]
-
-            self.images_txt.close()
-            self.config_set(self.mandelbrot[0])
-            self.mandelbrot[0] = np.array(self.image)
+            if escape_data is not None:
+                self.cancel_render()
+                self.show_set(view, escape_data, True)
+            else:
+                self.render_view(view, True)
+            # Render the saved set in the background if there is no escape data to load; it is
+            # displayed once it is done.
 
             self.open_window.destroy()
             self.task_running = False
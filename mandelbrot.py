@@ -1,31 +1,268 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
 import numpy as np
-from matplotlib.colors import hsv_to_rgb
-from PIL import Image
+
+ENGINE_VERSION = 1
+# Bump whenever a change alters the escape data or the colours of a view, so that renders
+# cached on disk by an older version are not used (see `cache.cache_key`).
+MODES = ('classic', 'grayscale', 'inverse_grayscale', 'distance_estimator')
+ALGORITHMS = ('escape_time', 'subdivision', 'approximate_subdivision')
+# The ways `compute_escape_data` can find the escape data of an image.
+KERNELS = ('complex', 'float64', 'float32')
+# The ways escape time is iterated: with complex128 arrays (see `iterate_points`) or with the
+# real and imaginary parts in separate arrays of float64 or float32 (see `iterate_split`).
+PALETTE_SIZE = 4096
+# The number of hues in the palette table of `palette_image`.
+BANDS_PER_WORKER = 4
+ESCAPE_DTYPE = np.dtype([
+    ('iterations', np.int64),
+    ('abs_z', np.float64),
+    ('abs_dz', np.float64),
+    ('interior', np.bool_),
+    ('active', np.bool_),
+    ('z', np.complex128),
+    ('dz', np.complex128)
+    ])
+# The layout of one pixel's escape data when it is shared between processes. `active` marks
+# the points that are still iterating when the band is done and `z` and `dz` hold their
+# state.
+CYCLE_TOLERANCE = 1e-14
+# Two values of z closer than this are taken to be the same point of a periodic orbit.
+MONITOR_INTERVAL = 0.05
+# How often, in seconds, a render waiting on its workers checks whether it was cancelled.
+PREVIEW_STRIDES = (8, 4, 2, 1)
+# The passes of a progressive render: every eighth pixel of every eighth row first, then
+# every fourth and so on.
+PREVIEW_STEPS = 64
+# The budget the passes of a progressive render are iterated with before the last pass
+# continues them to the full budget.
+
+_pool = None
+_pool_workers = None
+
+class RenderCancelled(Exception):
+# Raised inside a render that was cancelled through its `RenderMonitor`.
+
+    pass
+
+class RenderMonitor:
+# Lets another thread follow the progress of a render and cancel it. The render calls
+# `update` between iterations with the fraction of the work done so far, so a cancelled
+# render stops within one iteration. If `profile` is a `RenderProfile`, the render records
+# where its time goes into it.
+
+    def __init__(self, profile = None):
+
+        self.progress = 0
+        self.cancelled = False
+        self.profile = profile
+
+    def cancel(self):
+
+        self.cancelled = True
+
+    def update(self, progress):
+
+        self.progress = progress
+
+        if self.cancelled:
+            raise RenderCancelled()
+
+class _CancelFlag:
+# The `RenderMonitor` of a worker process: the render is cancelled once the byte at `offset`
+# of the shared `buffer` is set.
+
+    def __init__(self, buffer, offset, profile = None):
+
+        self.buffer = buffer
+        self.offset = offset
+        self.profile = profile
+
+    def update(self, progress):
+
+        if self.buffer[self.offset]:
+            raise RenderCancelled()
+
+def cancel_flag():
+# A byte of shared memory, set to 0, through which a render tells the worker processes
+# iterating chunks of its points that it was cancelled (see `_CancelFlag` and `wait_for`).
+# The caller closes and unlinks it once the workers are done.
+
+    memory = shared_memory.SharedMemory(create = True, size = 1)
+    memory.buf[0] = 0
+
+    return memory
+
+class RenderProfile:
+# Where the time of renders goes, for finding out why a view is slow. `phases` holds the
+# seconds spent in each phase: 'iterate' (the arithmetic of the iteration loops), 'mask'
+# (finding, recording and dropping the points that escaped), 'reference' (the reference
+# orbit of a deep zoom), 'escape' (the whole computation of the escape data, in wall time,
+# as `make_mandelbrot_set` and the explorer record it), 'colour' (the HSV colours, or the
+# palette lookup of the split kernels), 'hsv_to_rgb' and, in the explorer, 'probe' (choosing
+# `steps` for a zoom, see `budget`, as part of 'escape') and 'display'. The iteration
+# phases of worker processes are summed over the workers. `active[i]` is the number of
+# points that went into iteration i, summed over every pass that ran it.
+# `hook(kind, key, value)`, if given, is called with ('iteration', i, active) at every
+# iteration and with ('phase', name, seconds) whenever a phase other than the iteration
+# phases (which are timed in laps of every iteration) is recorded.
+# A render only records anything if it is given a profile through its `RenderMonitor`, so
+# renders without one do no extra work.
+
+    def __init__(self, hook = None):
+
+        self.hook = hook
+        self.phases = {}
+        self.active = []
+        self.last_lap = None
+
+    def __getstate__(self):
+    # Profiles of worker processes are sent back without their hook.
+
+        state = dict(self.__dict__)
+        state['hook'] = None
+
+        return state
+
+    def add(self, phase, seconds):
+
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+        if self.hook is not None:
+            self.hook('phase', phase, seconds)
+
+    def lap(self, phase = None):
+    # Add the time since the last lap to `phase`; with no `phase`, only start a lap.
+
+        clock = time.perf_counter()
+
+        if phase is not None:
+            self.phases[phase] = self.phases.get(phase, 0) + clock - self.last_lap
+
+        self.last_lap = clock
+
+    def iteration(self, i, active):
+
+        if i >= len(self.active):
+            self.active.extend([0] * (i + 1 - len(self.active)))
+
+        self.active[i] += active
+
+        if self.hook is not None:
+            self.hook('iteration', i, active)
+
+    def merge(self, other):
+    # Add the profile of a worker process to this one.
+
+        for phase, seconds in other.phases.items():
+            self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+        for i, active in enumerate(other.active):
+            if active:
+                self.iteration(i, active)
+
+    def pixel_iterations(self):
+
+        return sum(self.active)
+
+    def trace(self):
+    # The profile as a JSON-ready dictionary, with the pixel-iterations done up to and
+    # including each iteration.
+
+        iterations = []
+        total = 0
+
+        for i, active in enumerate(self.active):
+            total += active
+            iterations.append({'iteration': i, 'active': active, 'pixel_iterations': total})
+
+        return {'phases': self.phases, 'pixel_iterations': total, 'iterations': iterations}
+
+    def write(self, path):
+    # Write `trace()` to the JSON file `path`.
+
+        with open(path, 'w') as file:
+            json.dump(self.trace(), file, indent = 1)
+
+    def summary(self):
+    # A line of text with the time of each phase and the number of pixel-iterations.
+
+        phases = ', '.join(f'{phase} {seconds:.3f} s' for phase, seconds in self.phases.items())
+
+        return f'{phases}; {self.pixel_iterations() / 1e6:.1f} M pixel-iterations'
+
+class EscapeData:
+# The raw result of iterating every pixel of an image, independent of any colouring. Each
+# array is `height`-by-`width` and ordered like the complex plane, i.e. not yet flipped
+# upside down for display.
+# `iterations` is the iteration in which each point exceeded `bailout_radius` (`steps` for
+# points that never did), `abs_z` and `abs_dz` are the magnitudes of z and dz at that
+# iteration and `interior` is `True` for the points that never exceeded `bailout_radius`.
+# `active_index`, `active_z` and `active_dz` are the flat pixel indices and the values of
+# z and dz of the points that were still iterating after `steps` iterations, so that the
+# iteration can be continued to a larger `steps` instead of starting over. They are `None`
+# when that state was not kept; `source` may then be escape data of the same image that
+# can be continued or cut down instead.
+
+    def __init__(self, real_axis, imag_axis, bailout_radius, steps, iterations, abs_z, abs_dz, interior):
+
+        self.real_axis = real_axis
+        self.imag_axis = imag_axis
+        self.width = len(real_axis)
+        self.height = len(imag_axis)
+        self.bailout_radius = bailout_radius
+        self.steps = steps
+        self.iterations = iterations
+        self.abs_z = abs_z
+        self.abs_dz = abs_dz
+        self.interior = interior
+        self.active_index = None
+        self.active_z = None
+        self.active_dz = None
+        self.source = None
+        self.centre = None
+        # `centre` is set for deep zooms, whose axes are offsets from it (see `perturbation`).
+        self.skip_interior = False
+        self.detect_cycles = False
+        self.saved_iterations = 0
+        # The options the escape data was computed with and the number of pixel-iterations
+        # they saved (see `iterate_points`).
+
+    @classmethod
+    def empty(cls, real_axis, imag_axis, bailout_radius, steps):
+    # Escape data where every point is still considered interior.
+
+        shape = (len(imag_axis), len(real_axis))
+
+        return cls(
+            real_axis, imag_axis, bailout_radius, steps,
+            np.full(shape, steps, dtype = np.int64),
+            np.full(shape, np.e ** 2),
+            np.zeros(shape, dtype = np.float64),
+            np.ones(shape, dtype = bool)
+            )
+
+    def resumable(self):
+    # Whether the iteration state of the unfinished points was kept.
+
+        return self.active_index is not None
 
 def normalized_iteration(steps_taken, abs_z):
 # https://www.iquilezles.org/www/articles/mset_smooth/mset_smooth.htm
 # Map the iteration count of each complex number non-linearly to a value between
-# 0 and `steps` using `steps_taken`, the number of steps it takes for the number 
+# 0 and `steps` using `steps_taken`, the number of steps it takes for the number
 # to exceed `bailout_radius`, and `abs_z`, the magnitude of the complex number that
 # exceeds `bailout_radius`. Results in a smooth colour gradient.
 
     return steps_taken + 3 - np.log2(np.log2(abs_z * abs_z))
 
-def make_mandelbrot_set(real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, mode):
-# `bailout_radius` is the threshold the program uses to determine whether a number 
-# is diverging or not.
-# `steps` is the maximum number of times z \mapsto z ^ 2 + c is composed with itself
-# to check if z is greater than the bailout radius; if z exceeds the bailout radius,
-# z is not in the set. Increasing `steps` results in increased quality and render
-# time.
-
-    real_start = float(real_start)
-    real_end = float(real_end)
-    imag_start = float(imag_start)
-    imag_end = float(imag_end)
-    height = int(height)
-    bailout_radius = int(bailout_radius)
-    steps = int(steps)
+def make_plane(real_start, real_end, imag_start, imag_end, height):
+# Return the width of the image along with the real and imaginary axes of the complex plane
+# it covers.
 
     width = \
         int(abs(height * (real_end - real_start) / (imag_end - imag_start)))
@@ -36,137 +273,1028 @@ def make_mandelbrot_set(real_start, real_end, imag_start, imag_end, height, bail
         np.linspace(real_start, real_end, num = width)
     imag_axis = \
         np.linspace(imag_start, imag_end, num = height)
+
+    return width, real_axis, imag_axis
+
+def plane_points(real_axis, imag_axis, index):
+# The complex numbers of the pixels with the flat indices `index`.
+
+    c = np.zeros(len(index), dtype = np.complex128)
+    c.real = real_axis[index % len(real_axis)]
+    c.imag = imag_axis[index // len(real_axis)]
+
+    return c
+
+def in_cardioid_or_bulb(c):
+# https://en.wikipedia.org/wiki/Plotting_algorithms_for_the_Mandelbrot_set#Cardioid_/_bulb_checking
+# Whether each point lies in the main cardioid or the period-2 bulb, both of which are in
+# the set, so their points never exceed any bailout radius.
+
+    x = c.real - 1 / 4
+    y_squared = c.imag * c.imag
+    q = x * x + y_squared
+
+    return np.logical_or(q * (q + x) <= y_squared / 4, (c.real + 1) ** 2 + y_squared <= 1 / 16)
+
+def iterate_points(index, c, new_z, new_dz, first_step, steps, bailout_radius, iterations, abs_z, abs_dz, interior, detect_cycles = False, monitor = None):
+# Continue the Mandelbrot mapping of the points `c`, which have reached `new_z` and `new_dz`
+# after `first_step` iterations, up to `steps` iterations. The escape data of each point that
+# exceeds `bailout_radius` is written into the flat arrays `iterations`, `abs_z`, `abs_dz` and
+# `interior` at its flat pixel index in `index`. Returns `index`, `c`, `new_z` and `new_dz`
+# for the points that are still iterating, along with the number of pixel-iterations saved
+# by `detect_cycles`.
+# The arrays all shrink as points exceed `bailout_radius`, so later iterations do not touch
+# points that escaped long ago.
+# If `detect_cycles` is `True`, points whose orbit has become periodic stop iterating: they
+# will never exceed `bailout_radius`, so they are left interior. Each point's z is saved
+# after 1, 2, 4, 8, ... iterations and compared with every later z until the next save
+# (Brent's method), which finds a cycle of any length.
+# `monitor` is a `RenderMonitor` (or `None`) updated before every iteration, which records
+# into its `profile`, if any.
+
+    saved = 0
+    saved_z = np.copy(new_z) if detect_cycles else None
+    next_save = 1
+    profile = None if monitor is None else monitor.profile
+
+    if profile is not None:
+        profile.lap()
+
+    for i in range(first_step, steps):
+    # The maximum number of iterations is `steps`.
+
+        if monitor is not None:
+            monitor.update((i - first_step) / (steps - first_step))
+
+        if profile is not None:
+            profile.lap('mask')
+            profile.iteration(i, index.size)
+        # The time since the last lap went into the points that escaped in the last iteration.
+
+        new_dz = 2 * new_z * new_dz + 1
+        # d / dz z ^ 2 + c
+
+        new_z = new_z ** 2 + c
+        # Each point that has not yet exceeded `bailout_radius` is mapped to a new value by the
+        # Mandelbrot mapping.
+
+        magnitude = np.absolute(new_z)
+
+        if profile is not None:
+            profile.lap('iterate')
+
+        mask = magnitude > bailout_radius
+        # An element in `mask` is `True` iff the magnitude of the corresponding point exceeds
+        # `bailout_radius` in this iteration.
+
+        if detect_cycles:
+            difference = new_z - saved_z
+            cycled = difference.real ** 2 + difference.imag ** 2 < CYCLE_TOLERANCE ** 2
+            cycled[mask] = False
+            saved += int(np.count_nonzero(cycled)) * (steps - i - 1)
+            # The points whose z came back to the saved z. They keep the escape data of an
+            # interior point.
+
+            mask = np.logical_or(mask, cycled)
+            escaped = np.logical_and(mask, np.logical_not(cycled))
+        else:
+            escaped = mask
+
+        if not mask.any():
+            if detect_cycles and i - first_step + 1 == next_save:
+                saved_z = np.copy(new_z)
+                next_save <<= 1
+            continue
+
+        pixels = index[escaped]
+        iterations[pixels] = i
+        abs_z[pixels] = magnitude[escaped]
+        abs_dz[pixels] = np.absolute(new_dz[escaped])
+        interior[pixels] = False
+        # Record the escape data of the points that escaped in this iteration.
+
+        keep = np.logical_not(mask)
+        index = index[keep]
+        c = c[keep]
+        new_z = new_z[keep]
+        new_dz = new_dz[keep]
+        # Drop the escaped points from the active arrays.
+
+        if detect_cycles:
+            saved_z = saved_z[keep]
+            if i - first_step + 1 == next_save:
+                saved_z = np.copy(new_z)
+                next_save <<= 1
+
+        if index.size == 0:
+            break
+        # Stop once every point has escaped.
+
+    if profile is not None:
+        profile.lap('mask')
+
+    return index, c, new_z, new_dz, saved
+
+def iterate_split(index, c, new_z, new_dz, first_step, steps, bailout_radius, iterations, abs_z, abs_dz, interior, dtype = np.float64, monitor = None):
+# `iterate_points` without cycle detection, with the real and imaginary parts of c, z and dz
+# in separate arrays of `dtype`. Every iteration is computed in place, with `out =`, into
+# arrays allocated once, and |z| ^ 2 is compared with `bailout_radius` ^ 2 so no square root
+# is taken but for the points that escape. Nothing is allocated in an iteration in which no
+# point escapes, and the arrays are only compacted once a quarter of their points are done.
+# The points that are still iterating are returned as complex128 arrays, as
+# `iterate_points` returns them, so the result can be continued either way.
+# With float64 the result matches `iterate_points` but for points whose |z| lands within
+# rounding of `bailout_radius`. With float32, whose mantissa has 24 bits, the iteration
+# counts of points near the boundary of the set drift apart from float64's: at 300 pixels
+# tall, 0.2% of the pixels of the whole set differ, 1% of a view 0.35 wide and 4% of a view
+# 0.035 wide. Beyond that the pixel spacing nears the resolution of float32 and the image
+# falls apart (28% of a view 0.00035 wide), so float32 is for shallow views only.
+
+    count = index.size
+    state = [np.empty(count, dtype = dtype) for _ in range(6)]
+    real, imag, z_real, z_imag, dz_real, dz_imag = state
+    real[:] = c.real
+    imag[:] = c.imag
+    z_real[:] = new_z.real
+    z_imag[:] = new_z.imag
+    dz_real[:] = new_dz.real
+    dz_imag[:] = new_dz.imag
+
+    first = np.empty(count, dtype = dtype)
+    second = np.empty(count, dtype = dtype)
+    mask = np.empty(count, dtype = bool)
+    position = np.arange(count)
+    # The position of each point in the arguments, which is -1 once it has escaped.
+    bailout_squared = dtype(bailout_radius) ** 2
+    finished = 0
+    profile = None if monitor is None else monitor.profile
+
+    if profile is not None:
+        profile.lap()
+
+    def compact():
+    # Move the points that are still iterating to the front of the arrays and make every
+    # array only look at as many elements as there are points left.
+
+        nonlocal position, state, first, second, mask
+
+        keep = np.flatnonzero(position >= 0)
+        for array in [position] + state:
+            array[:keep.size] = array[keep]
+
+        position = position[:keep.size]
+        state = [array[:keep.size] for array in state]
+        first, second, mask = first[:keep.size], second[:keep.size], mask[:keep.size]
+
+        return state
+
+    for i in range(first_step, steps):
+
+        if monitor is not None:
+            monitor.update((i - first_step) / (steps - first_step))
+
+        if profile is not None:
+            profile.lap('mask')
+            profile.iteration(i, position.size - finished)
+
+        np.multiply(z_real, dz_real, out = first)
+        np.multiply(z_imag, dz_imag, out = second)
+        np.subtract(first, second, out = first)
+        np.multiply(z_real, dz_imag, out = second)
+        np.multiply(z_imag, dz_real, out = dz_imag)
+        np.add(dz_imag, second, out = dz_imag)
+        dz_imag *= 2
+        np.multiply(first, 2, out = dz_real)
+        dz_real += 1
+        # dz = 2 z dz + 1, from the z before this iteration.
+
+        np.multiply(z_real, z_real, out = first)
+        np.multiply(z_imag, z_imag, out = second)
+        np.multiply(z_real, z_imag, out = z_imag)
+        z_imag *= 2
+        z_imag += imag
+        np.subtract(first, second, out = z_real)
+        z_real += real
+        # z = z ^ 2 + c
+
+        np.multiply(z_real, z_real, out = first)
+        np.multiply(z_imag, z_imag, out = second)
+        np.add(first, second, out = first)
+        # `first` is |z| ^ 2.
+
+        if profile is not None:
+            profile.lap('iterate')
+
+        np.greater(first, bailout_squared, out = mask)
+
+        if not mask.any():
+            continue
+
+        escaped = np.flatnonzero(mask)
+        pixels = index[position[escaped]]
+        iterations[pixels] = i
+        abs_z[pixels] = np.sqrt(first[escaped])
+        abs_dz[pixels] = np.hypot(dz_real[escaped], dz_imag[escaped])
+        interior[pixels] = False
+
+        position[escaped] = -1
+        for array in state:
+            array[escaped] = 0
+        finished += escaped.size
+        # The points that escaped are set to c = z = 0, which never escapes, rather than
+        # moved out of the arrays in every iteration.
+
+        if finished == position.size:
+            break
+
+        if finished * 4 > position.size:
+            real, imag, z_real, z_imag, dz_real, dz_imag = compact()
+            finished = 0
+        # Once a quarter of the points are done, they are dropped so that later iterations
+        # do not spend time on them.
+
+    real, imag, z_real, z_imag, dz_real, dz_imag = compact()
+
+    if profile is not None:
+        profile.lap('mask')
+
+    return index[position], c[position], \
+        z_real + 1j * z_imag.astype(np.float64), dz_real + 1j * dz_imag.astype(np.float64), 0
+
+def escape_band(real_axis, imag_axis, bailout_radius, steps, iterations, abs_z, abs_dz, interior, skip_interior = False, detect_cycles = False, monitor = None, kernel = 'complex'):
+# Iterate the rows of the complex plane given by `real_axis` and `imag_axis` and write their
+# escape data into `iterations`, `abs_z`, `abs_dz` and `interior`, each a
+# `len(imag_axis)`-by-`len(real_axis)` matrix. Returns the flat indices (within the band)
+# and the values of z and dz of the points that are still iterating, along with the number
+# of pixel-iterations saved.
+# If `skip_interior` is `True`, the points in the main cardioid and the period-2 bulb are
+# marked interior without being iterated.
+# `kernel` is one of `KERNELS`; `detect_cycles` only applies to 'complex'.
+
+    rows = len(imag_axis)
+    width = len(real_axis)
+
     complex_plane = \
-        np.zeros((height, width), dtype = np.complex_)
+        np.zeros((rows, width), dtype = np.complex128)
+
+    complex_plane.real = real_axis[np.newaxis, :]
+    complex_plane.imag = imag_axis[:, np.newaxis]
+    # `complex_plane` is a `width`-by-`rows` matrix where each element is the corresponding
+    # complex number on the complex plane. The axes are broadcast rather than expanded to
+    # full matrices first.
+
+    flat_iterations = iterations.reshape(-1)
+    flat_abs_z = abs_z.reshape(-1)
+    flat_abs_dz = abs_dz.reshape(-1)
+    flat_interior = interior.reshape(-1)
+    # Views of the results with one element per pixel so that escape data can be written back
+    # by flat pixel index.
+
+    flat_iterations[:] = steps
+    flat_abs_z[:] = np.e ** 2
+    flat_abs_dz[:] = 0
+    flat_interior[:] = True
+    # Points that never exceed `bailout_radius` keep these values. `abs_z` is `np.e ** 2`
+    # because this is the value necessary to achieve an output of `steps` from
+    # `normalized_iteration`. Arbitrary values also colour the pixel black, but this method
+    # has an comprehendible reason.
+
+    index = np.arange(rows * width)
+    c = complex_plane.ravel()
+    saved = 0
+
+    if skip_interior:
+        inside = in_cardioid_or_bulb(c)
+        saved = int(np.count_nonzero(inside)) * steps
+        index = index[np.logical_not(inside)]
+        c = c[index]
+
+    if kernel == 'complex':
+        index, c, new_z, new_dz, cycles_saved = iterate_points(
+            index, c, np.copy(c), np.zeros_like(c), 0, steps, bailout_radius,
+            flat_iterations, flat_abs_z, flat_abs_dz, flat_interior, detect_cycles, monitor
+            )
+    else:
+        index, c, new_z, new_dz, cycles_saved = iterate_split(
+            index, c, c, np.complex128(0), 0, steps, bailout_radius,
+            flat_iterations, flat_abs_z, flat_abs_dz, flat_interior, np.dtype(kernel).type, monitor
+            )
+    # `new_dz` (the second zero matrix) is identical to `new_z` except the fact that it will
+    # contain a different mapping found here:
+    # http://www.mrob.com/pub/muency/distanceestimator.html.
+
+    return index, new_z, new_dz, saved + cycles_saved
+
+def _escape_shared_band(name, shape, real_axis, imag_axis, first_row, bailout_radius, steps, skip_interior, detect_cycles, kernel = 'complex', profile = False):
+# Run in a worker process. Attach to the shared escape data buffer called `name` and iterate
+# the band of rows starting at `first_row` straight into it, so nothing but the number of
+# pixel-iterations saved (and the `RenderProfile` of the band if `profile` is `True`, or
+# `None`) is pickled on return.
 
-    real, imag = np.meshgrid(real_axis, imag_axis)
+    memory = shared_memory.SharedMemory(name = name)
+    shared = np.ndarray(shape, dtype = ESCAPE_DTYPE, buffer = memory.buf)
+    band = shared[first_row:first_row + len(imag_axis)]
+    profile = RenderProfile() if profile else None
+    try:
+        index, new_z, new_dz, saved = escape_band(real_axis, imag_axis, bailout_radius, steps,
+            band['iterations'], band['abs_z'], band['abs_dz'], band['interior'],
+            skip_interior, detect_cycles, _CancelFlag(memory.buf, shared.nbytes, profile), kernel)
+        band['active'] = False
+        band['active'].reshape(-1)[index] = True
+        band['z'].reshape(-1)[index] = new_z
+        band['dz'].reshape(-1)[index] = new_dz
+    finally:
+        del shared, band
+        memory.close()
 
-    complex_plane.real = real
-    complex_plane.imag = imag
-    # `complex_plane` is a `width`-by-`height` matrix where each element is the corresponding 
-    # complex number on the complex plane. 
+    return saved, profile
 
+def _continue_chunk(flag_name, c, new_z, new_dz, first_step, steps, bailout_radius, detect_cycles, profile = False):
+# Run in a worker process. Continue the iteration of a chunk of unfinished points and return
+# the escape data of the chunk along with the state of the points still iterating and, if
+# `profile` is `True`, the `RenderProfile` of the chunk (otherwise `None`). The chunk stops
+# within an iteration once the `cancel_flag` called `flag_name` is set.
+
+    size = len(c)
+    iterations = np.full(size, steps, dtype = np.int64)
+    abs_z = np.full(size, np.e ** 2)
+    abs_dz = np.zeros(size, dtype = np.float64)
+    interior = np.ones(size, dtype = bool)
+    profile = RenderProfile() if profile else None
+    memory = shared_memory.SharedMemory(name = flag_name)
+
+    try:
+        index, c, new_z, new_dz, saved = iterate_points(
+            np.arange(size), c, new_z, new_dz, first_step, steps, bailout_radius,
+            iterations, abs_z, abs_dz, interior, detect_cycles, _CancelFlag(memory.buf, 0, profile)
+            )
+    finally:
+        memory.close()
+
+    return iterations, abs_z, abs_dz, interior, index, new_z, new_dz, saved, profile
+
+def escape_points(index, c, new_z, new_dz, first_step, steps, data, workers = 1, detect_cycles = False, monitor = None):
+# Iterate the points `c`, with flat pixel indices `index` in `data`, from `new_z` and `new_dz`
+# after `first_step` iterations up to `steps` iterations, writing their escape data into
+# `data`. The points are split between `workers` processes if there are enough of them.
+# Returns `index`, `new_z` and `new_dz` for the points that are still iterating, along with
+# the number of pixel-iterations saved by `detect_cycles`.
+
+    if workers > 1 and index.size > workers:
+        profile = None if monitor is None else monitor.profile
+        chunks = [chunk for chunk in np.array_split(np.arange(index.size), workers * BANDS_PER_WORKER) if chunk.size]
+        pool = get_pool(workers)
+        flag = cancel_flag()
+        try:
+            futures = [
+                pool.submit(_continue_chunk, flag.name, c[chunk], new_z[chunk], new_dz[chunk],
+                    first_step, steps, data.bailout_radius, detect_cycles, profile is not None)
+                for chunk in chunks
+                ]
+            # Only the points to iterate are sent to the workers.
+
+            results = wait_for(futures, monitor, flag.buf)
+        finally:
+            flag.close()
+            flag.unlink()
+
+        remaining = []
+        saved = 0
+        for chunk, chunk_result in zip(chunks, results):
+            iterations, abs_z, abs_dz, interior, positions, chunk_z, chunk_dz, chunk_saved, chunk_profile = chunk_result
+            pixels = index[chunk]
+            data.iterations.reshape(-1)[pixels] = iterations
+            data.abs_z.reshape(-1)[pixels] = abs_z
+            data.abs_dz.reshape(-1)[pixels] = abs_dz
+            data.interior.reshape(-1)[pixels] = interior
+            remaining.append((pixels[positions], chunk_z, chunk_dz))
+            saved += chunk_saved
+            if profile is not None:
+                profile.merge(chunk_profile)
+
+        return \
+            np.concatenate([i for i, _, _ in remaining]), np.concatenate([z for _, z, _ in remaining]), \
+            np.concatenate([dz for _, _, dz in remaining]), saved
+
+    index, _, new_z, new_dz, saved = iterate_points(
+        index, c, new_z, new_dz, first_step, steps, data.bailout_radius,
+        data.iterations.reshape(-1), data.abs_z.reshape(-1),
+        data.abs_dz.reshape(-1), data.interior.reshape(-1), detect_cycles, monitor
+        )
+
+    return index, new_z, new_dz, saved
+
+def get_pool(workers):
+# Return a process pool with `workers` processes. The pool is kept between renders since
+# starting processes costs more than rendering a small zoom. The processes are spawned
+# rather than forked since renders may be started from a thread of the explorer.
+
+    global _pool, _pool_workers
+
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(
+            max_workers = workers, mp_context = multiprocessing.get_context('spawn'))
+        _pool_workers = workers
+
+    return _pool
+
+def wait_for(futures, monitor = None, flag = None):
+# Wait for `futures` and return their results in order, keeping `monitor` up to date with the
+# fraction of them done. If the render is cancelled, the futures that have not started are
+# cancelled, the byte `flag[0]` (when given) is set to stop the running ones, and
+# `RenderCancelled` is raised once they have stopped.
+
+    pending = set(futures)
+
+    while pending:
+        done, pending = wait(pending, timeout = MONITOR_INTERVAL, return_when = FIRST_COMPLETED)
+
+        if monitor is not None:
+            try:
+                monitor.update(1 - len(pending) / len(futures))
+
+            except RenderCancelled:
+                if flag is not None:
+                    flag[0] = 1
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+                raise
+
+    return [future.result() for future in futures]
+
+def escape_parallel(real_axis, imag_axis, bailout_radius, steps, data, workers, skip_interior = False, detect_cycles = False, monitor = None, kernel = 'complex'):
+# Split the image into bands of rows and iterate them on `workers` processes. The bands are
+# written into shared memory and copied into `data` once every band is done.
+
+    height = len(imag_axis)
+    shape = (height, len(real_axis))
+    bands = min(height, workers * BANDS_PER_WORKER)
+    bounds = np.linspace(0, height, num = bands + 1).astype(int)
+    # Points near the set take far longer than points that escape immediately, so there are
+    # several bands per worker to keep every worker busy until the end.
+
+    profile = None if monitor is None else monitor.profile
+    size = shape[0] * shape[1] * ESCAPE_DTYPE.itemsize
+    memory = shared_memory.SharedMemory(create = True, size = size + 1)
+    shared = np.ndarray(shape, dtype = ESCAPE_DTYPE, buffer = memory.buf)
+    flag = memory.buf[size:]
+    flag[0] = 0
+    # The byte after the escape data tells the workers the render was cancelled.
+    try:
+
+        pool = get_pool(workers)
+        futures = [
+            pool.submit(_escape_shared_band, memory.name, shape, real_axis,
+                imag_axis[start:end], start, bailout_radius, steps, skip_interior, detect_cycles, kernel, profile is not None)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+            ]
+
+        for saved, band_profile in wait_for(futures, monitor, flag):
+            data.saved_iterations += saved
+            if profile is not None:
+                profile.merge(band_profile)
+        # Also re-raises any error from a worker.
+
+        data.iterations[:] = shared['iterations']
+        data.abs_z[:] = shared['abs_z']
+        data.abs_dz[:] = shared['abs_dz']
+        data.interior[:] = shared['interior']
+
+        data.active_index = np.flatnonzero(shared['active'])
+        data.active_z = shared['z'].reshape(-1)[data.active_index]
+        data.active_dz = shared['dz'].reshape(-1)[data.active_index]
+    finally:
+        del shared
+        flag.release()
+        memory.close()
+        memory.unlink()
+    # The views of the shared memory must be gone before it can be closed.
+
+def compute_escape_data(real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, workers = 1, skip_interior = False, detect_cycles = False, monitor = None, preview = None, algorithm = 'escape_time', cross_check = False, kernel = 'complex'):
+# Iterate every pixel of the image and return its `EscapeData`. The arguments are those of
+# `make_mandelbrot_set` without the colouring. Views too deep for float64 are handed to
+# `perturbation`, in which case the bounds should be `Decimal`s or strings carrying every
+# digit of the zoom.
+# `skip_interior` marks the points of the main cardioid and the period-2 bulb interior
+# without iterating them and `detect_cycles` stops iterating points whose orbit has become
+# periodic. Neither changes the result, only the time it takes; `saved_iterations` of the
+# result tells how many pixel-iterations they saved. Both only apply to float64 views.
+# `monitor` is an optional `RenderMonitor` through which another thread can follow the
+# render and cancel it, in which case `RenderCancelled` is raised.
+# If `preview` is given, the image is rendered progressively (see `progressive_escape`) and
+# `preview(stride, data)` is called after each coarse pass.
+# `steps` may also be a function returning the budget. A progressive render calls it once
+# the first pass has been previewed, so that choosing the budget does not hold up the
+# preview; other renders call it before they start.
+# `algorithm` is one of `ALGORITHMS`. 'escape_time' iterates every pixel, 'subdivision' only
+# the borders of the parts of the image that are not in the set (see `subdivision`) and
+# 'approximate_subdivision' fills in parts that escape in the same iteration as well. With
+# `cross_check`, the image is also rendered with 'escape_time' and `RuntimeError` is raised
+# if the two differ; the approximate algorithm is only checked for `iterations` and
+# `interior`. Neither `preview` nor `algorithm` applies to views too deep for float64.
+# `kernel` is one of `KERNELS` and applies to 'escape_time' renders without `preview`; the
+# split kernels trade cycle detection and, for float32, accuracy (see `iterate_split`) for
+# less memory and fewer allocations.
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'unknown algorithm {algorithm!r}')
+
+    if kernel not in KERNELS:
+        raise ValueError(f'unknown kernel {kernel!r}')
+
+    import perturbation
+
+    if callable(steps) and (preview is None or algorithm != 'escape_time' or perturbation.needs_perturbation(real_start, real_end, imag_start, imag_end, height)):
+        steps = steps()
+
+    if perturbation.needs_perturbation(real_start, real_end, imag_start, imag_end, height):
+        return perturbation.compute_perturbed_escape_data(
+            real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, workers, monitor)
+
+    real_start = float(real_start)
+    real_end = float(real_end)
+    imag_start = float(imag_start)
+    imag_end = float(imag_end)
+    height = int(height)
+    bailout_radius = int(bailout_radius)
+    steps = steps if callable(steps) else int(steps)
+    workers = os.cpu_count() if workers is None else int(workers)
+
+    width, real_axis, imag_axis = \
+        make_plane(real_start, real_end, imag_start, imag_end, height)
+
+    if algorithm != 'escape_time':
+        import subdivision
+
+        data = subdivision.compute_subdivided_escape_data(
+            real_axis, imag_axis, bailout_radius, steps, workers, skip_interior, detect_cycles,
+            monitor, algorithm == 'approximate_subdivision')
+
+        if cross_check:
+            reference = compute_escape_data(real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, workers, skip_interior, detect_cycles, monitor)
+            fields = ('iterations', 'interior') if algorithm == 'approximate_subdivision' else ('iterations', 'abs_z', 'abs_dz', 'interior')
+            for field in fields:
+                differences = np.count_nonzero(getattr(data, field) != getattr(reference, field))
+                if differences:
+                    raise RuntimeError(f'{algorithm} differs from escape_time in {field} at {differences} pixels')
+
+        return data
+
+    if preview is not None:
+        return progressive_escape(real_axis, imag_axis, bailout_radius, steps, workers, skip_interior, detect_cycles, monitor, preview)
+
+    data = EscapeData.empty(real_axis, imag_axis, bailout_radius, steps)
+    data.skip_interior = skip_interior
+    data.detect_cycles = detect_cycles
+
+    if workers > 1 and height > 1:
+        escape_parallel(real_axis, imag_axis, bailout_radius, steps, data, workers, skip_interior, detect_cycles, monitor, kernel)
+    else:
+        data.active_index, data.active_z, data.active_dz, data.saved_iterations = \
+            escape_band(real_axis, imag_axis, bailout_radius, steps,
+                data.iterations, data.abs_z, data.abs_dz, data.interior,
+                skip_interior, detect_cycles, monitor, kernel)
+
+    return data
+
+def progressive_escape(real_axis, imag_axis, bailout_radius, steps, workers, skip_interior, detect_cycles, monitor, preview):
+# Render the image in passes, calling `preview(stride, data)` after each pass but the last.
+# The first pass iterates every eighth pixel of every eighth row with at most `PREVIEW_STEPS`
+# iterations, which takes a fraction of the time of the whole image. Each finer pass (every
+# fourth pixel, every second, all of them) only iterates the pixels the coarser passes have
+# not, and the last pass continues the unfinished points of every pass to `steps`. The
+# result is the same as rendering the image in one go and no pixel is iterated twice.
+# If `steps` is a function, it is called for the budget once the first pass is previewed.
+
+    choose = steps if callable(steps) else None
+    budget = PREVIEW_STEPS if choose is not None else min(steps, PREVIEW_STEPS)
+    data = EscapeData.empty(real_axis, imag_axis, bailout_radius, budget)
+    data.skip_interior = skip_interior
+    data.detect_cycles = detect_cycles
+    data.active_index = np.zeros(0, dtype = np.int64)
+    data.active_z = np.zeros(0, dtype = np.complex128)
+    data.active_dz = np.zeros(0, dtype = np.complex128)
+
+    done = np.zeros((data.height, data.width), dtype = bool)
+
+    for stride in PREVIEW_STRIDES:
+
+        todo = np.zeros_like(done)
+        todo[::stride, ::stride] = True
+        todo[done] = False
+        done[todo] = True
+        # The pixels of this pass that no coarser pass has iterated.
+
+        index = np.flatnonzero(todo)
+        c = plane_points(real_axis, imag_axis, index)
+
+        if skip_interior:
+            inside = in_cardioid_or_bulb(c)
+            data.saved_iterations += int(np.count_nonzero(inside)) * budget
+            keep = np.logical_not(inside)
+            index = index[keep]
+            c = c[keep]
+
+        index, new_z, new_dz, saved = escape_points(
+            index, c, np.copy(c), np.zeros_like(c), 0, budget, data,
+            workers if stride < PREVIEW_STRIDES[0] else 1, detect_cycles, monitor
+            )
+        # The first pass is too small to be worth handing to the workers.
+
+        data.active_index = np.concatenate((data.active_index, index))
+        data.active_z = np.concatenate((data.active_z, new_z))
+        data.active_dz = np.concatenate((data.active_dz, new_dz))
+        data.saved_iterations += saved
+
+        if stride > 1 or choose is not None or budget < steps:
+            preview(stride, data)
+
+        if choose is not None:
+            steps = int(choose())
+            choose = None
+
+    return continue_escape_data(data, steps, workers, monitor)
+
+def truncate_escape_data(data, steps):
+# Return the escape data `data` would have had with the smaller budget `steps`: points that
+# needed `steps` iterations or more become interior. The iteration state is not known at
+# `steps`, so the result cannot be continued itself; it keeps `data` as its `source`
+# instead.
+
+    interior = np.logical_or(data.interior, data.iterations >= steps)
+
+    truncated = EscapeData(
+        data.real_axis, data.imag_axis, data.bailout_radius, steps,
+        np.where(interior, steps, data.iterations),
+        np.where(interior, np.e ** 2, data.abs_z),
+        np.where(interior, 0, data.abs_dz),
+        interior
+        )
+    truncated.source = data
+    truncated.centre = data.centre
+    truncated.skip_interior = data.skip_interior
+    truncated.detect_cycles = data.detect_cycles
+
+    return truncated
+
+def continue_escape_data(data, steps, workers = 1, monitor = None):
+# Return the escape data of the same image with the budget `steps`, continuing the
+# iteration of the unfinished points of `data` instead of starting over. The result is
+# identical to computing the escape data afresh with `steps`. Returns `None` if neither
+# `data` nor its `source` kept the state needed to do so.
+
+    steps = int(steps)
+    workers = os.cpu_count() if workers is None else int(workers)
+
+    while not data.resumable() and data.source is not None:
+        data = data.source
+    # Cut-down escape data defers to the escape data it was cut down from.
+
+    if steps == data.steps:
+        return data
+
+    if steps < data.steps:
+        return truncate_escape_data(data, steps)
+
+    if not data.resumable():
+        return None
+
+    result = EscapeData(
+        data.real_axis, data.imag_axis, data.bailout_radius, steps,
+        np.copy(data.iterations), np.copy(data.abs_z), np.copy(data.abs_dz),
+        np.copy(data.interior)
+        )
+    result.iterations[data.interior] = steps
+    # Copies, so that `data` stays valid for going back to the smaller budget.
+
+    result.skip_interior = data.skip_interior
+    result.detect_cycles = data.detect_cycles
+    index = data.active_index
+    c = plane_points(data.real_axis, data.imag_axis, index)
+    result.saved_iterations = \
+        (int(np.count_nonzero(data.interior)) - index.size) * (steps - data.steps)
+    # The interior points that are no longer iterating were found by `skip_interior` or
+    # `detect_cycles` and save every one of the new iterations.
+
+    result.active_index, result.active_z, result.active_dz, saved = escape_points(
+        index, c, data.active_z, data.active_dz, data.steps, steps, result, workers,
+        data.detect_cycles, monitor
+        )
+    result.saved_iterations += saved
+
+    return result
+
+def shifted_axis(axis, shift):
+# The axis `axis` moved along by `shift` pixels. The values shared with `axis` are copied
+# exactly, so the pixels they belong to can be reused.
+
+    size = len(axis)
+    positions = np.arange(size) + shift
+    step = (axis[-1] - axis[0]) / (size - 1) if size > 1 else 0
+    shifted = axis[0] + positions * step
+    shared = np.logical_and(positions >= 0, positions < size)
+    shifted[shared] = axis[positions[shared]]
+
+    return shifted
+
+def pan_escape_data(data, rows, columns, workers = 1, monitor = None):
+# Return the escape data of the image moved by `rows` and `columns` pixels along the
+# imaginary and real axes, so that pixel (i, j) of the result is pixel (i + rows, j + columns)
+# of `data`. The pixels the two images share are copied and only the strips that come into
+# view are iterated, so moving by a tenth of the image costs about a tenth of rendering it.
+# Returns `None` for deep zooms, whose pixels are iterated relative to the centre of the image.
+
+    if data.centre is not None:
+        return None
+
+    workers = os.cpu_count() if workers is None else int(workers)
+    height, width = data.height, data.width
+    result = EscapeData.empty(
+        shifted_axis(data.real_axis, columns), shifted_axis(data.imag_axis, rows),
+        data.bailout_radius, data.steps
+        )
+    result.skip_interior = data.skip_interior
+    result.detect_cycles = data.detect_cycles
+
+    target = (slice(max(-rows, 0), min(height - rows, height)), slice(max(-columns, 0), min(width - columns, width)))
+    source = (slice(max(rows, 0), min(height + rows, height)), slice(max(columns, 0), min(width + columns, width)))
+    for field in ('iterations', 'abs_z', 'abs_dz', 'interior'):
+        getattr(result, field)[target] = getattr(data, field)[source]
+    # The pixels the two images share.
+
+    exposed = np.ones((height, width), dtype = bool)
+    exposed[target] = False
+    index = np.flatnonzero(exposed)
+    c = plane_points(result.real_axis, result.imag_axis, index)
+
+    if result.skip_interior:
+        inside = in_cardioid_or_bulb(c)
+        result.saved_iterations += int(np.count_nonzero(inside)) * result.steps
+        keep = np.logical_not(inside)
+        index = index[keep]
+        c = c[keep]
+
+    index, new_z, new_dz, saved = escape_points(
+        index, c, np.copy(c), np.zeros_like(c), 0, result.steps, result, workers,
+        result.detect_cycles, monitor
+        )
+    result.saved_iterations += saved
+
+    if data.resumable():
+        row = data.active_index // width - rows
+        column = data.active_index % width - columns
+        shared = np.logical_and.reduce((row >= 0, row < height, column >= 0, column < width))
+        result.active_index = np.concatenate((row[shared] * width + column[shared], index))
+        result.active_z = np.concatenate((data.active_z[shared], new_z))
+        result.active_dz = np.concatenate((data.active_dz[shared], new_dz))
+    # The unfinished points of both can still be continued to a larger `steps`.
+
+    return result
+
+def escape_hsv(iterations, abs_z, abs_dz, interior, steps, mode):
+# Map escape data of any shape to HSV colours with a trailing axis of three. The distance
+# estimator colouring is left unnormalized since its normalization depends on the whole
+# image.
+
+    escaped = np.logical_not(interior)
     pixels = \
-        np.zeros((height, width, 3), dtype = np.float_)
-    # `pixels` is a `width`-by-`height`-by-three matrix where the three-tuple corresponds to 
-    # a colour on the complex plane, eventually determined by the complex number's convergence 
-    # or rate of divergence. 
-
-    new_z = np.copy(complex_plane)
-    # `new_z` is a matrix like `complex_plane` that will hold the resulting values of complex 
-    # numbers after successive iterations of the Mandelbrot mapping. A future masking matrix 
-    # checks whether the magnitude of each value exceeds `bailout_radius` and colours the
-    # corresponding element in `pixels` accordingly if so.
-
-    new_dz = np.zeros_like(complex_plane)
-    # `new_dz` is identical to `new_z` except the fact that it will contain a different mapping
-    # found here: http://www.mrob.com/pub/muency/distanceestimator.html.
-
-    is_not_done = np.ones((height, width), dtype = bool)
-    # `is_not_done` is a `width`-by-`height` Boolean matrix that indicates whether a 
-    # complex number has exceeded `bailout_radius`. Such a matrix is necessary to avoid 
-    # any unnecessary computation.
-    
+        np.zeros(iterations.shape + (3,), dtype = np.float64)
+    # `pixels` holds a three-tuple for every point corresponding to a colour on the complex
+    # plane, determined by the complex number's convergence or rate of divergence.
+
     if mode == 'classic':
     # If the user wants the "classic Mandelbrot colouring."
 
-        for i in range(steps):
-        # The maximum number of iterations is `steps`.
-
-            new_z[is_not_done] = \
-                new_z[is_not_done] ** 2 + complex_plane[is_not_done]
-            # Each element in `new` that has not yet exceeded `bailout_radius` is mapped
-            # to a new value by the Mandelbrot mapping.
-            
-            mask = np.logical_and(np.absolute(new_z) > bailout_radius, is_not_done)
-            # An element in `mask` is `True` iff its magnitude exceeds `bailout_radius` and
-            # its magnitude has not previously exceeded `bailout_radius`.
-
-            pixels[mask, :] = (i, 1 - i/steps, 1 - i/steps) 
-            # If a given complex number meets the above conditions, it is coloured, for now,
-            # based on the number of iterations it took to exceed `bailout_radius`.
-
-            is_not_done = np.logical_and(is_not_done, np.logical_not(mask))
-            # `is_not_done` is updated based on the points that were coloured in this iteration. 
-
-        new_after_mask = np.zeros_like(complex_plane)
-        new_after_mask[np.logical_not(is_not_done)] = new_z[np.logical_not(is_not_done)]
-        new_after_mask[is_not_done] = np.e ** 2 
-        # `new_after_mask` consists of complex numbers on the plane corresponding to the number
-        # whose magnitude exceeded the bailout radius. `new_after_mask[is_not_done] = np.e ** 2`
-        # because this is the value necessary to achieve an output of `steps` from  
-        # `normalized_iteration`. Arbitrary values for `new_after_mask[is_not_done]`also colour 
-        # the pixel black, but this method has an comprehendible reason.
-
-        pixels[:, :, 0] = \
-            normalized_iteration(pixels[:, :, 0], np.absolute(new_after_mask)) / steps
+        pixels[escaped, 0] = iterations[escaped]
+        pixels[escaped, 1] = 1 - iterations[escaped] / steps
+        pixels[escaped, 2] = 1 - iterations[escaped] / steps
+        # Colour the pixel, for now, based on the number of iterations it took to exceed
+        # `bailout_radius`.
+
+        pixels[..., 0] = \
+            normalized_iteration(pixels[..., 0], np.where(interior, np.e ** 2, abs_z)) / steps
         # Smooth out the colour gradient of the image by putting it through `normalized_iteration`.
         # Normalizes the values by dividing by `steps`.
 
     elif mode == 'grayscale':
-    # If the user wants a colouring where the colouring is grayscaled and black represents a 
+    # If the user wants a colouring where the colouring is grayscaled and black represents a
     # number in the set.
 
-        for i in range(steps):
+        pixels[escaped, 2] = 1 - iterations[escaped] / steps
 
-            new_z[is_not_done] = \
-                new_z[is_not_done] ** 2 + complex_plane[is_not_done]
+    elif mode == 'inverse_grayscale':
+    # If the user wants a colouring where the colouring is grayscaled and white represents a
+    # number in the set.
 
-            mask = np.logical_and(np.absolute(new_z) > bailout_radius, is_not_done)
+        pixels[..., 2] = 1
+        pixels[escaped, 2] = iterations[escaped] / steps
 
-            pixels[mask, :] = (0, 0, 1 - i/steps)
+    elif mode == 'distance_estimator':
+    # If the user wants the distance estimator colouring (default, rainbow).
 
-            is_not_done = np.logical_and(is_not_done, np.logical_not(mask))
+        z = abs_z[escaped]
+        dz = abs_dz[escaped]
+        pixels[escaped, 0] = 2 * np.log(z) * z / dz
+        # Refer to http://www.mrob.com/pub/muency/distanceestimator.html.
 
-    elif mode == 'inverse_grayscale':
-    # If the user wants a colouring where the colouring is grayscaled and white represents a 
-    # number in the set.
+        pixels[escaped, 1] = 0.5
+        pixels[escaped, 2] = 1 - iterations[escaped] / steps
 
-        pixels[:] = (0, 0, 1)
+    else:
+        raise ValueError(f'unknown colouring mode {mode!r}')
 
-        for i in range(steps):
+    return pixels
 
-            new_z[is_not_done] = \
-                new_z[is_not_done] ** 2 + complex_plane[is_not_done]
+def hsv_to_rgb(hsv):
+# Convert an array of HSV colours, along its last axis and between 0 and 1, to RGB between 0
+# and 1, with the same arithmetic and so the same result as `matplotlib.colors.hsv_to_rgb`.
+# Importing matplotlib for it alone took half of the time of starting the explorer.
 
-            mask = np.logical_and(np.absolute(new_z) > bailout_radius, is_not_done)
+    hsv = np.asarray(hsv)
+    hsv = hsv.astype(np.promote_types(hsv.dtype, np.float32), copy = False)
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
 
-            pixels[mask, :] = (0, 0, i/steps)
+    i = (h * 6.0).astype(int)
+    f = (h * 6.0) - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    sector = i % 6
+    # The sixth of the hue circle each colour is in; a hue of 1 is red again.
 
-            is_not_done = np.logical_and(is_not_done, np.logical_not(mask))
+    rgb = np.stack([
+        np.choose(sector, (v, q, p, p, t, v)),
+        np.choose(sector, (t, v, v, q, p, p)),
+        np.choose(sector, (p, p, t, v, v, q))
+        ], axis = -1).astype(hsv.dtype, copy = False)
 
-    elif mode == 'distance_estimator':
-    # If the user wants the distance estimator colouring (default, rainbow).
+    grey = s == 0
+    rgb[grey] = v[grey, np.newaxis]
 
-        for i in range(steps):
+    return rgb
 
-            new_dz[is_not_done] = \
-                2 * new_z[is_not_done] * new_dz[is_not_done] + 1
-            # d / dz z ^ 2 + c
+def hsv_to_image(pixels):
+# Convert HSV colours in plane order to an RGB image, flip it upside down (the set would be
+# upside down otherwise), and bring the values between 0 and 255.
 
-            new_z[is_not_done] = \
-                new_z[is_not_done] ** 2 + complex_plane[is_not_done]
-            
-            mask = np.logical_and(np.absolute(new_z) > bailout_radius, is_not_done)
+    return (hsv_to_rgb(np.flipud(pixels)) * 255).astype(np.uint8)
 
-            z = np.abs(new_z[mask])
-            dz = np.abs(new_dz[mask])
-            # If a complex number has exceeded `bailout_radius`, we need the magnitude of `z` and 
-            # `dz` generated by that number to compute the distance.  
+def colour_escape_data(data, mode, profile = None):
+# Colour `data` with the colouring `mode` and return the RGB image. No iteration happens
+# here, so changing the colouring of an image is cheap. The time taken is recorded into the
+# `RenderProfile` `profile`, if given.
 
-            pixels[mask, 0] = 2 * np.log(z) * z / dz
-            # Refer to http://www.mrob.com/pub/muency/distanceestimator.html.
+    start = time.perf_counter()
+    pixels = escape_hsv(data.iterations, data.abs_z, data.abs_dz, data.interior, data.steps, mode)
 
-            pixels[mask, 1:] = (0.5, 1 - i/steps)
+    if mode == 'distance_estimator':
+        pixels[:, :, 0] /= np.amax(pixels[:, :, 0])
+    # The distance estimator is normalized over the whole image.
 
-            is_not_done = np.logical_and(is_not_done, np.logical_not(mask))
+    if profile is None:
+        return hsv_to_image(pixels)
 
-        pixels[is_not_done, :] = (0, 0, 0)
-        pixels[:, :, 0] /= np.amax(pixels[:, :, 0])
+    coloured = time.perf_counter()
+    image = hsv_to_image(pixels)
+    profile.add('colour', coloured - start)
+    profile.add('hsv_to_rgb', time.perf_counter() - coloured)
+
+    return image
+
+def hue_table(size = PALETTE_SIZE):
+# The fully saturated and bright colours of `size` hues evenly spaced from 0 to 1, as a
+# `size`-by-3 table of `np.uint8`.
+
+    hues = np.zeros((size, 3))
+    hues[:, 0] = np.linspace(0, 1, size)
+    hues[:, 1:] = 1
+
+    return np.round(hsv_to_rgb(hues) * 255).astype(np.uint8)
+
+def palette_image(data, mode, size = PALETTE_SIZE):
+# `colour_escape_data` through lookup tables instead of an HSV image of float64 converted
+# by `hsv_to_rgb`. The grayscale colourings come straight from a table of the value of each
+# iteration count and match `colour_escape_data` exactly. The other two look their hue up
+# in `hue_table(size)` and scale it by the saturation and value of the pixel, in float32;
+# they are within one level of `colour_escape_data` in each channel.
+
+    if mode not in MODES:
+        raise ValueError(f'unknown colouring mode {mode!r}')
+
+    iterations = np.flipud(data.iterations)
+    interior = np.flipud(data.interior)
+    counts = np.arange(data.steps + 1)
+
+    if mode in ('grayscale', 'inverse_grayscale'):
+
+        if mode == 'grayscale':
+            table = ((1 - counts / data.steps) * 255).astype(np.uint8)
+            inside = 0
+        else:
+            table = (counts / data.steps * 255).astype(np.uint8)
+            inside = 255
+        # As `escape_hsv` and `hsv_to_image` compute them.
+
+        grey = table[np.minimum(iterations, data.steps)]
+        grey[interior] = inside
+
+        return np.repeat(grey[..., np.newaxis], 3, axis = 2)
+
+    abs_z = np.flipud(data.abs_z)
+    values = (1 - counts / data.steps).astype(np.float32)
+    value = values[np.minimum(iterations, data.steps)]
+
+    if mode == 'classic':
+        hue = normalized_iteration(iterations.astype(np.float32), abs_z.astype(np.float32)) / data.steps
+        saturation = value
+    else:
+        abs_dz = np.flipud(data.abs_dz).astype(np.float32)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            hue = 2 * np.log(abs_z.astype(np.float32)) * abs_z.astype(np.float32) / abs_dz
+        hue[interior] = 0
+        largest = np.amax(hue)
+        if largest > 0:
+            hue /= largest
+        # Normalized over the whole image, as in `colour_escape_data`.
+        saturation = np.float32(0.5)
+
+    hue_index = np.clip(np.rint(hue * (size - 1)), 0, size - 1).astype(np.intp)
+    scale = value * saturation
+    image = hue_table(size)[hue_index] * scale[..., np.newaxis]
+    image += (value - scale)[..., np.newaxis] * 255
+    # v (1 - s) + v s (fully saturated colour) is the HSV colour.
+    image[interior] = 0
+
+    return image.astype(np.uint8)
+
+def colour_preview(data, stride, mode):
+# Colour the pixels of `data` on every `stride`th row and column and scale them up to the
+# size of the whole image, each filling the `stride`-by-`stride` block below and to the
+# right of it in the complex plane.
+
+    preview = EscapeData(
+        data.real_axis[::stride], data.imag_axis[::stride], data.bailout_radius, data.steps,
+        data.iterations[::stride, ::stride], data.abs_z[::stride, ::stride],
+        data.abs_dz[::stride, ::stride], data.interior[::stride, ::stride]
+        )
+    pixels = np.flipud(colour_escape_data(preview, mode))
+    # Back in plane order, so that the blocks line up with the pixels they stand for.
+
+    pixels = np.repeat(np.repeat(pixels, stride, axis = 0), stride, axis = 1)
+
+    return np.flipud(pixels[:data.height, :data.width])
+
+def make_mandelbrot_set(real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, mode, workers = 1, kernel = 'complex', profile = None, cache = None, antialias = None):
+# `bailout_radius` is the threshold the program uses to determine whether a number
+# is diverging or not.
+# `steps` is the maximum number of times z \mapsto z ^ 2 + c is composed with itself
+# to check if z is greater than the bailout radius; if z exceeds the bailout radius,
+# z is not in the set. Increasing `steps` results in increased quality and render
+# time.
+# `workers` is the number of processes to render with; `None` uses every core. The result
+# is identical whatever the number of workers.
+# `kernel` is one of `KERNELS`. The split kernels are coloured through `palette_image`.
+# `profile` is an optional `RenderProfile` to record where the time goes into.
+# `cache` is an optional `cache.RenderCache`: the escape data is taken from it if it has the
+# set, whatever its colouring, and put into it otherwise.
+# With `antialias`, the pixels on the boundary of the set are iterated again at `antialias`
+# by `antialias` points and given the average of their colours (see `antialias`).
+
+    start = time.perf_counter()
+    bounds = (real_start, real_end, imag_start, imag_end)
+    data = None if cache is None else cache.get(bounds, height, bailout_radius, steps, kernel)
+
+    if data is None:
+        data = compute_escape_data(real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, workers,
+            monitor = None if profile is None else RenderMonitor(profile), kernel = kernel)
+        if cache is not None:
+            cache.put(bounds, height, bailout_radius, steps, data, kernel)
+
+    if profile is not None:
+        profile.add('escape', time.perf_counter() - start)
+
+    if kernel != 'complex':
+        start = time.perf_counter()
+        image = palette_image(data, mode)
+        if profile is not None:
+            profile.add('colour', time.perf_counter() - start)
+    else:
+        image = colour_escape_data(data, mode, profile)
+
+    if antialias:
+        import antialias as antialiasing
+
+        start = time.perf_counter()
+        antialiasing.antialias_image(data, mode, image, antialias, workers = workers,
+            monitor = None if profile is None else RenderMonitor(profile))
+        if profile is not None:
+            profile.add('antialias', time.perf_counter() - start)
 
-    return [(hsv_to_rgb(np.flipud(pixels)) * 255).astype(np.uint8), width]
-    # Convert the image to RGB, flip it upside down (the set would be upside down otherwise),
-    # and bring the values between 0 and 255. Return this image as well as the image width.
+    return [image, data.width]
+    # Return the image as well as the image width.
 
 # Credit to:
 # http://www.mrob.com/pub/muency/distanceestimator.html
@@ -177,4 +1305,4 @@ def make_mandelbrot_set(real_start, real_end, imag_start, imag_end, height, bail
 # generation and colouring. I feel incredibly well-versed in fractal colouring methods
 # and the mathematics behind those methods, but an overall lack of documentation on
 # how to get a satisfying colouring from the generated values led to countless hours of
-# unsuccessful trial and error and an overall subpar program in the colouring category.  
+# unsuccessful trial and error and an overall subpar program in the colouring category.
@@ -0,0 +1,312 @@
+import math
+import os
+import time
+from decimal import Decimal, localcontext
+import numpy as np
+from multiprocessing import shared_memory
+from mandelbrot import BANDS_PER_WORKER, EscapeData, RenderProfile, _CancelFlag, cancel_flag, get_pool, wait_for
+
+DEEP_ZOOM_SPACING = 2 ** -40
+# Below this pixel spacing (relative to the magnitude of the coordinates) float64 can no
+# longer tell neighbouring pixels apart well enough and the image turns blocky.
+SERIES_TOLERANCE = 2 ** -30
+# The series approximation is used for as long as its last term stays this small relative
+# to its first.
+GUARD_DIGITS = 20
+
+# Deep zooms: https://en.wikipedia.org/wiki/Plotting_algorithms_for_the_Mandelbrot_set#Perturbation_theory_and_series_approximation
+# One point of the image, the reference, is iterated with as many digits as the zoom
+# needs. Every pixel is then iterated in float64 as the small difference `delta` between
+# its orbit and the reference orbit:
+#     z = Z + delta, c = C + delta_c
+#     delta \mapsto 2 * Z * delta + delta ^ 2 + delta_c
+# which only ever involves small numbers, so float64 keeps its full relative precision no
+# matter how deep the zoom is.
+
+def decimal_digits(span):
+# The number of significant digits needed to tell apart the pixels of a view `span` wide.
+
+    span = abs(Decimal(span))
+
+    if span == 0:
+        return 28
+
+    return max(28, GUARD_DIGITS - span.adjusted())
+
+def needs_perturbation(real_start, real_end, imag_start, imag_end, height):
+# Whether the view is too deep for float64. The coordinates may be `Decimal`s, strings or
+# floats.
+
+    real_start, real_end, imag_start, imag_end = \
+        [Decimal(i) for i in (real_start, real_end, imag_start, imag_end)]
+
+    spacing = abs(imag_end - imag_start) / max(int(height) - 1, 1)
+    scale = max(abs(real_start), abs(real_end), abs(imag_start), abs(imag_end), Decimal(1))
+
+    return spacing < scale * Decimal(DEEP_ZOOM_SPACING)
+
+def reference_orbit(centre_real, centre_imag, bailout_radius, steps, monitor = None):
+# Iterate the reference `centre_real + centre_imag * i` with `Decimal`s for at most `steps`
+# iterations or until it exceeds `bailout_radius`. The orbit is returned in float64 and starts
+# with z = 0 followed by z = c, so that a pixel can be rebased onto the start of the orbit.
+
+    orbit = [0j, complex(float(centre_real), float(centre_imag))]
+    real, imag = centre_real, centre_imag
+    bailout_squared = bailout_radius * bailout_radius
+
+    for i in range(steps):
+
+        if monitor is not None and i % 1024 == 0:
+            monitor.update(0)
+
+        real, imag = real * real - imag * imag + centre_real, 2 * real * imag + centre_imag
+        orbit.append(complex(float(real), float(imag)))
+
+        if float(real) ** 2 + float(imag) ** 2 > bailout_squared:
+            break
+
+    return np.array(orbit, dtype = np.complex128)
+
+def series_skip(orbit, delta_max, bailout_radius, steps):
+# https://fractalwiki.org/wiki/Series_approximation
+# Approximate every pixel's `delta` and `dz` after n iterations by polynomials in its
+# `delta_c`:
+#     delta ~ A * delta_c + B * delta_c ^ 2 + C * delta_c ^ 3
+#     dz ~ D + E * delta_c + F * delta_c ^ 2
+# The coefficients are the same for the whole image, so the first n iterations need not be
+# done per pixel. Return n along with the coefficients after n iterations. n is the largest
+# number of iterations for which the cubic term stays negligible and no pixel can have
+# exceeded `bailout_radius` yet.
+
+    a, b, c, d, e, f = 1, 0, 0, 0, 0, 0
+    # The coefficients with zero iterations done, where z = c, i.e. `delta = delta_c`.
+
+    skipped = 0
+    coefficients = (a, b, c, d, e, f)
+
+    for n in range(1, min(steps, len(orbit) - 3) + 1):
+    # The last iteration skipped must leave room in the orbit for the next one.
+
+        z = orbit[n]
+        a, b, c, d, e, f = \
+            2 * z * a + 1, 2 * z * b + a * a, 2 * z * c + 2 * a * b, \
+            2 * z * d + 1, 2 * (z * e + a * d), 2 * (z * f + a * e + b * d)
+        # The coefficients of the series after n iterations, found by substituting the series
+        # into the mapping of `delta` and dz \mapsto 2 * z * dz + 1.
+
+        if not all(map(np.isfinite, (a, b, c, d, e, f))):
+            break
+
+        if abs(c) * delta_max ** 2 > SERIES_TOLERANCE * abs(a):
+            break
+        # The series no longer converges fast enough.
+
+        bound = abs(orbit[n + 1]) + abs(a) * delta_max + abs(b) * delta_max ** 2 + abs(c) * delta_max ** 3
+        if bound > bailout_radius:
+            break
+        # A pixel could have exceeded `bailout_radius` in this iteration.
+
+        skipped = n
+        coefficients = (a, b, c, d, e, f)
+
+    return skipped, coefficients
+
+def perturb_points(index, delta_c, delta, new_dz, position, first_step, steps, orbit, bailout_radius, iterations, abs_z, abs_dz, interior, monitor = None):
+# The perturbed counterpart of `mandelbrot.iterate_points`. `position` is the index into
+# `orbit` each pixel currently follows. A pixel is rebased onto the start of the orbit when
+# its z gets closer to zero than `delta` is (otherwise `delta` would lose its precision and
+# the pixel would glitch) or when it reaches the end of the orbit.
+# Returns the number of rebases done.
+
+    rebases = 0
+    last = len(orbit) - 1
+    profile = None if monitor is None else monitor.profile
+
+    if profile is not None:
+        profile.lap()
+
+    for i in range(first_step, steps):
+
+        if monitor is not None:
+            monitor.update((i - first_step) / (steps - first_step))
+
+        if profile is not None:
+            profile.lap('mask')
+            profile.iteration(i, index.size)
+
+        reference = orbit[position]
+        new_dz = 2 * (reference + delta) * new_dz + 1
+        # d / dz z ^ 2 + c
+
+        delta = (2 * reference + delta) * delta + delta_c
+        position = position + 1
+        new_z = orbit[position] + delta
+
+        magnitude = np.absolute(new_z)
+
+        if profile is not None:
+            profile.lap('iterate')
+
+        mask = magnitude > bailout_radius
+
+        if mask.any():
+
+            escaped = index[mask]
+            iterations[escaped] = i
+            abs_z[escaped] = magnitude[mask]
+            abs_dz[escaped] = np.absolute(new_dz[mask])
+            interior[escaped] = False
+
+            keep = np.logical_not(mask)
+            index = index[keep]
+            delta_c = delta_c[keep]
+            delta = delta[keep]
+            new_dz = new_dz[keep]
+            position = position[keep]
+            new_z = new_z[keep]
+            magnitude = magnitude[keep]
+
+            if index.size == 0:
+                break
+
+        glitched = np.logical_or(magnitude < np.absolute(delta), position == last)
+        # Glitch detection: the pixel's orbit has come close to zero, where `delta` would
+        # cancel the reference, or the reference orbit has run out.
+
+        if glitched.any():
+            delta[glitched] = new_z[glitched]
+            position[glitched] = 0
+            rebases += int(np.count_nonzero(glitched))
+        # Rebase: `orbit[0]` is zero, so `delta` becomes z itself.
+
+    if profile is not None:
+        profile.lap('mask')
+
+    return rebases
+
+def _perturb_chunk(flag_name, delta_c, delta, new_dz, first_step, steps, orbit, bailout_radius, profile = False):
+# Run in a worker process. Iterate a chunk of pixels and return its escape data and, if
+# `profile` is `True`, its `RenderProfile` (otherwise `None`). The chunk stops within an
+# iteration once the `cancel_flag` called `flag_name` is set.
+
+    size = len(delta_c)
+    iterations = np.full(size, steps, dtype = np.int64)
+    abs_z = np.full(size, np.e ** 2)
+    abs_dz = np.zeros(size, dtype = np.float64)
+    interior = np.ones(size, dtype = bool)
+    profile = RenderProfile() if profile else None
+    memory = shared_memory.SharedMemory(name = flag_name)
+
+    try:
+        rebases = perturb_points(
+            np.arange(size), delta_c, delta, new_dz, np.full(size, first_step + 1), first_step,
+            steps, orbit, bailout_radius, iterations, abs_z, abs_dz, interior, _CancelFlag(memory.buf, 0, profile)
+            )
+    finally:
+        memory.close()
+
+    return iterations, abs_z, abs_dz, interior, rebases, profile
+
+def escape_offsets(delta_c, orbit, delta_max, bailout_radius, steps, iterations, abs_z, abs_dz, interior, workers = 1, monitor = None):
+# Iterate the points at the offsets `delta_c` (a flat array) from the reference of `orbit`
+# and write their escape data into the flat arrays `iterations`, `abs_z`, `abs_dz` and
+# `interior`. `delta_max` is the largest magnitude in `delta_c`. Returns the number of
+# iterations skipped by the series approximation and the number of rebases.
+
+    skipped, (a, b, c, d, e, f) = series_skip(orbit, delta_max, bailout_radius, steps)
+
+    delta = ((c * delta_c + b) * delta_c + a) * delta_c
+    new_dz = (f * delta_c + e) * delta_c + d
+    # Every pixel's state after the skipped iterations.
+
+    profile = None if monitor is None else monitor.profile
+    size = delta_c.size
+    rebases = 0
+
+    if workers > 1 and size > workers:
+        chunks = [i for i in np.array_split(np.arange(size), workers * BANDS_PER_WORKER) if i.size]
+        pool = get_pool(workers)
+        flag = cancel_flag()
+        try:
+            futures = [
+                pool.submit(_perturb_chunk, flag.name, delta_c[chunk], delta[chunk], new_dz[chunk],
+                    skipped, steps, orbit, bailout_radius, profile is not None)
+                for chunk in chunks
+                ]
+            results = wait_for(futures, monitor, flag.buf)
+        finally:
+            flag.close()
+            flag.unlink()
+
+        for chunk, chunk_result in zip(chunks, results):
+            chunk_iterations, chunk_abs_z, chunk_abs_dz, chunk_interior, chunk_rebases, chunk_profile = chunk_result
+            if profile is not None:
+                profile.merge(chunk_profile)
+            iterations[chunk] = chunk_iterations
+            abs_z[chunk] = chunk_abs_z
+            abs_dz[chunk] = chunk_abs_dz
+            interior[chunk] = chunk_interior
+            rebases += chunk_rebases
+
+    else:
+        rebases = perturb_points(
+            np.arange(size), delta_c, delta, new_dz, np.full(size, skipped + 1), skipped,
+            steps, orbit, bailout_radius, iterations, abs_z, abs_dz, interior, monitor
+            )
+
+    return skipped, rebases
+
+def compute_perturbed_escape_data(real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, workers = 1, monitor = None):
+# Iterate every pixel of a deep view with perturbation theory and return its `EscapeData`.
+# The bounds may be `Decimal`s or strings with as many digits as the zoom needs. The axes of
+# the result hold each pixel's offset from the reference, `data.centre`.
+
+    height = int(height)
+    bailout_radius = int(bailout_radius)
+    steps = int(steps)
+    workers = os.cpu_count() if workers is None else int(workers)
+
+    with localcontext() as context:
+
+        real_start, real_end, imag_start, imag_end = \
+            [Decimal(i) for i in (real_start, real_end, imag_start, imag_end)]
+        context.prec = decimal_digits(imag_end - imag_start)
+
+        width = \
+            int(abs(height * (real_end - real_start) / (imag_end - imag_start)))
+        # As in `mandelbrot.make_plane`.
+
+        centre_real = (real_start + real_end) / 2
+        centre_imag = (imag_start + imag_end) / 2
+
+        real_axis = np.linspace(float(real_start - centre_real), float(real_end - centre_real), num = width)
+        imag_axis = np.linspace(float(imag_start - centre_imag), float(imag_end - centre_imag), num = height)
+        # The offsets are small numbers, so float64 holds them precisely.
+
+        start = time.perf_counter()
+        orbit = reference_orbit(centre_real, centre_imag, bailout_radius, steps, monitor)
+
+    data = EscapeData.empty(real_axis, imag_axis, bailout_radius, steps)
+    data.centre = (centre_real, centre_imag)
+
+    delta_c = np.zeros((height, width), dtype = np.complex128)
+    delta_c.real, delta_c.imag = np.meshgrid(real_axis, imag_axis)
+    delta_c = delta_c.ravel()
+
+    delta_max = math.hypot(np.abs(real_axis).max(initial = 0), np.abs(imag_axis).max(initial = 0))
+    profile = None if monitor is None else monitor.profile
+
+    if profile is not None:
+        profile.add('reference', time.perf_counter() - start)
+
+    skipped, rebases = escape_offsets(
+        delta_c, orbit, delta_max, bailout_radius, steps, data.iterations.reshape(-1),
+        data.abs_z.reshape(-1), data.abs_dz.reshape(-1), data.interior.reshape(-1), workers, monitor
+        )
+
+    data.skipped_steps = skipped
+    data.rebases = rebases
+    # How many iterations the series approximation saved every pixel and how many times a
+    # pixel had to be rebased.
+
+    return data
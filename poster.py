@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import FIRST_COMPLETED, wait
+import numpy as np
+from numpy.lib.format import open_memmap
+import mandelbrot
+import perturbation
+
+# Render posters far larger than memory, e.g. a 40000-pixel-tall one:
+#     python poster.py -2.5 1 1.25 -1.25 40000 1024 512 distance_estimator poster.png
+# The escape data is written tile by tile into a memory-mapped `.npy` file next to the
+# poster, each tile by a worker process of its own, and the tiles that are done are recorded
+# in a second one, so an interrupted render picks up where it stopped. The poster is then
+# coloured a band of rows at a time and streamed into the PNG, so neither the escape data nor
+# the image is ever held in memory whole. The distance estimator colouring is normalized by
+# the largest distance of the whole poster, which each tile records, so the tiles match.
+
+TILE_SIZE = 1024
+# The height and width of a tile, in pixels.
+BAND_PIXELS = 2 ** 20
+# The number of pixels coloured and written to the PNG at once.
+POSTER_DTYPE = np.dtype([
+    ('iterations', np.int64),
+    ('abs_z', np.float64),
+    ('abs_dz', np.float64),
+    ('interior', np.bool_)
+    ])
+TILE_DTYPE = np.dtype([('done', np.bool_), ('largest_distance', np.float64)])
+IN_FLIGHT_PER_WORKER = 2
+
+class PngWriter:
+# Write an RGB PNG a band of rows at a time, compressing as it goes.
+
+    def __init__(self, path, width, height, level = 6):
+
+        self.file = open(path, 'wb')
+        self.compressor = zlib.compressobj(level)
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        # Eight bits per channel, truecolour, no interlacing.
+
+    def chunk(self, kind, data):
+
+        self.file.write(struct.pack('>I', len(data)) + kind + data)
+        self.file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def write_rows(self, rows):
+    # Append `rows`, a rows-by-width-by-3 array of `np.uint8`, to the image.
+
+        lines = np.zeros((rows.shape[0], rows.shape[1] * 3 + 1), dtype = np.uint8)
+        lines[:, 1:] = rows.reshape(rows.shape[0], -1)
+        # Each line starts with its filter type, 0 (none).
+
+        data = self.compressor.compress(lines.tobytes())
+        if data:
+            self.chunk(b'IDAT', data)
+
+    def close(self):
+
+        self.chunk(b'IDAT', self.compressor.flush())
+        self.chunk(b'IEND', b'')
+        self.file.close()
+
+def _render_tile(escape_path, real_axis, imag_axis, first_row, first_column, bailout_radius, steps, skip_interior, detect_cycles):
+# Run in a worker process. Iterate one tile straight into the memory-mapped escape data and
+# return the largest distance estimate in it.
+
+    rows, columns = len(imag_axis), len(real_axis)
+    iterations = np.empty((rows, columns), dtype = np.int64)
+    abs_z = np.empty((rows, columns))
+    abs_dz = np.empty((rows, columns))
+    interior = np.empty((rows, columns), dtype = bool)
+
+    mandelbrot.escape_band(real_axis, imag_axis, bailout_radius, steps, iterations, abs_z, abs_dz, interior, skip_interior, detect_cycles)
+
+    escape = np.load(escape_path, mmap_mode = 'r+')
+    tile = escape[first_row:first_row + rows, first_column:first_column + columns]
+    tile['iterations'] = iterations
+    tile['abs_z'] = abs_z
+    tile['abs_dz'] = abs_dz
+    tile['interior'] = interior
+    escape.flush()
+    del escape, tile
+    # On disk before the tile is marked as done.
+
+    distances = mandelbrot.escape_hsv(iterations, abs_z, abs_dz, interior, steps, 'distance_estimator')[..., 0]
+
+    return float(np.amax(distances, initial = 0))
+
+def render_poster(real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, mode, path, tile_size = TILE_SIZE, workers = None, skip_interior = True, detect_cycles = True, keep = False, report = None):
+# Render the poster with the parameters of `mandelbrot.make_mandelbrot_set` into the PNG
+# `path`. The escape data and the progress are kept in `path + '.escape.npy'` and
+# `path + '.tiles.npy'` until the PNG is written (for good if `keep` is `True`, so the
+# poster can be coloured again without iterating), and a render of the same poster that was
+# interrupted is resumed from them. `report` is called with the number of tiles done and
+# the total as tiles finish.
+
+    if mode not in mandelbrot.MODES:
+        raise ValueError(f'unknown colouring mode {mode!r}')
+
+    if perturbation.needs_perturbation(real_start, real_end, imag_start, imag_end, height):
+        raise ValueError('posters of zooms too deep for float64 are not supported')
+
+    height = int(height)
+    bailout_radius = int(bailout_radius)
+    steps = int(steps)
+    workers = os.cpu_count() if workers is None else int(workers)
+
+    width, real_axis, imag_axis = mandelbrot.make_plane(
+        float(real_start), float(real_end), float(imag_start), float(imag_end), height)
+
+    escape_path = path + '.escape.npy'
+    tiles_path = path + '.tiles.npy'
+    parameters_path = path + '.json'
+    parameters = [str(i) for i in (real_start, real_end, imag_start, imag_end, height, bailout_radius, steps, tile_size, skip_interior, detect_cycles)]
+    tile_rows = -(-height // tile_size)
+    tile_columns = -(-width // tile_size)
+
+    resume = os.path.exists(parameters_path)
+    if resume:
+        with open(parameters_path) as file:
+            resume = json.load(file) == parameters
+    # Working files of another poster are started over.
+
+    if resume:
+        tiles = np.load(tiles_path, mmap_mode = 'r+')
+    else:
+        open_memmap(escape_path, mode = 'w+', dtype = POSTER_DTYPE, shape = (height, width))
+        tiles = open_memmap(tiles_path, mode = 'w+', dtype = TILE_DTYPE, shape = (tile_rows, tile_columns))
+        with open(parameters_path, 'w') as file:
+            json.dump(parameters, file)
+
+    pool = mandelbrot.get_pool(workers)
+    running = {}
+
+    def collect(done):
+
+        for future in done:
+            row, column = running.pop(future)
+            tiles[row, column] = (True, future.result())
+            tiles.flush()
+            if report is not None:
+                report(int(np.count_nonzero(tiles['done'])), tiles.size)
+
+    for row in range(tile_rows):
+        for column in range(tile_columns):
+
+            if tiles[row, column]['done']:
+                continue
+
+            if len(running) >= workers * IN_FLIGHT_PER_WORKER:
+                done, _ = wait(running, return_when = FIRST_COMPLETED)
+                collect(done)
+
+            first_row, first_column = row * tile_size, column * tile_size
+            future = pool.submit(_render_tile, escape_path,
+                real_axis[first_column:first_column + tile_size], imag_axis[first_row:first_row + tile_size],
+                first_row, first_column, bailout_radius, steps, skip_interior, detect_cycles)
+            running[future] = (row, column)
+
+    collect(wait(running).done)
+
+    largest_distance = float(np.amax(tiles['largest_distance']))
+    escape = np.load(escape_path, mmap_mode = 'r')
+    band_rows = max(1, BAND_PIXELS // max(width, 1))
+    writer = PngWriter(path + '.part', width, height)
+
+    for band_end in range(height, 0, -band_rows):
+    # From the top of the image, which is the end of the complex plane.
+
+        band = escape[max(band_end - band_rows, 0):band_end]
+        pixels = mandelbrot.escape_hsv(band['iterations'], band['abs_z'], band['abs_dz'], band['interior'], steps, mode)
+
+        if mode == 'distance_estimator' and largest_distance > 0:
+            pixels[..., 0] /= largest_distance
+        # Normalized over the whole poster, as `colour_escape_data` normalizes over the whole
+        # image.
+
+        writer.write_rows(mandelbrot.hsv_to_image(pixels))
+
+    writer.close()
+    del escape, tiles
+    os.replace(path + '.part', path)
+
+    if not keep:
+        for working_path in (escape_path, tiles_path, parameters_path):
+            os.remove(working_path)
+
+def main(arguments = None):
+
+    parser = argparse.ArgumentParser(description = 'Render a Mandelbrot poster larger than memory to PNG.')
+    for name in ('real_start', 'real_end', 'imag_end', 'imag_start'):
+        parser.add_argument(name)
+    parser.add_argument('height', type = int)
+    parser.add_argument('bailout_radius', type = int)
+    parser.add_argument('steps', type = int)
+    parser.add_argument('mode', choices = mandelbrot.MODES)
+    parser.add_argument('path', help = 'the PNG to write')
+    parser.add_argument('--tile-size', type = int, default = TILE_SIZE)
+    parser.add_argument('--workers', type = int, default = None, help = 'number of processes (default: every core)')
+    parser.add_argument('--keep', action = 'store_true', help = 'keep the escape data for colouring the poster again')
+    arguments = parser.parse_args(arguments)
+
+    render_poster(
+        arguments.real_start, arguments.real_end, arguments.imag_end, arguments.imag_start,
+        arguments.height, arguments.bailout_radius, arguments.steps, arguments.mode, arguments.path,
+        arguments.tile_size, arguments.workers, keep = arguments.keep,
+        report = lambda done, total: print(f'{done}/{total} tiles', flush = True)
+        )
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
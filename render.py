@@ -0,0 +1,160 @@
+import argparse
+import csv
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from decimal import Decimal
+from PIL import Image, PngImagePlugin
+import mandelbrot
+
+# Render saved views to PNG without the explorer (and without tkinter), e.g.
+#     python render.py images.txt views.json --output images
+# Views are read from `images.txt`-format files (name real_start real_end imag_end
+# imag_start height bailout_radius steps mode on each line) or from JSON or CSV files of
+# records with those fields. They are rendered in parallel, one view per process, and
+# each result is reported as soon as it is written. An image whose PNG already carries the
+# signature of its view, of the current colouring and of `mandelbrot.ENGINE_VERSION` is
+# skipped: a change to the palette or to what the iteration computes renders every image
+# again, and an interrupted job picks up where it stopped.
+
+FIELDS = ('name', 'real_start', 'real_end', 'imag_end', 'imag_start', 'height', 'bailout_radius', 'steps', 'mode')
+SIGNATURE_KEY = 'mandelbrot-signature'
+# The PNG text chunk holding the signature of the render.
+IN_FLIGHT_PER_WORKER = 2
+# Views handed to the workers ahead of time, so that memory does not grow with the job.
+
+def read_views(path):
+# Yield the views in `path` as dictionaries with the keys `FIELDS`, one at a time.
+
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path, newline = '') as file:
+
+        if extension == '.json':
+            records = json.load(file)
+        elif extension == '.csv':
+            records = csv.DictReader(file)
+        else:
+            records = (dict(zip(FIELDS, line.split())) for line in file if line.strip())
+
+        for record in records:
+            yield {field: str(record[field]) for field in FIELDS}
+
+def colouring_source():
+# The source of the colouring, so that changing the palette changes every signature.
+
+    return ''.join(inspect.getsource(function) for function in (
+        mandelbrot.normalized_iteration, mandelbrot.escape_hsv, mandelbrot.hsv_to_rgb, mandelbrot.hsv_to_image,
+        mandelbrot.colour_escape_data
+        ))
+
+def signature(view, colouring):
+# The signature of `view` rendered with `colouring` by the iteration of `ENGINE_VERSION`, so
+# that a change to what the iteration computes renders every view again too.
+
+    parameters = ' '.join(view[field] for field in FIELDS[1:])
+
+    return hashlib.sha256(f'{mandelbrot.ENGINE_VERSION} {parameters}\n{colouring}'.encode()).hexdigest()
+
+def up_to_date(path, view_signature):
+# Whether the PNG at `path` was rendered with `view_signature`.
+
+    try:
+        with Image.open(path) as image:
+            return image.text.get(SIGNATURE_KEY) == view_signature
+    except (OSError, SyntaxError):
+        return False
+
+def _render_view(view, path, view_signature):
+# Run in a worker process. Render `view` and write it to `path`, so only the time taken is
+# pickled back.
+
+    start = time.perf_counter()
+    image, _ = mandelbrot.make_mandelbrot_set(
+        Decimal(view['real_start']), Decimal(view['real_end']),
+        Decimal(view['imag_end']), Decimal(view['imag_start']),
+        int(view['height']), int(view['bailout_radius']), int(view['steps']), view['mode']
+        )
+    # The bounds are in the order `make_mandelbrot_set` expects them, as in `main.py`.
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text(SIGNATURE_KEY, view_signature)
+    temporary = path + '.part'
+    Image.fromarray(image).save(temporary, format = 'PNG', pnginfo = info)
+    os.replace(temporary, path)
+    # An interrupted job never leaves a truncated image behind.
+
+    return time.perf_counter() - start
+
+def render_views(views, output, workers = None, force = False, report = print):
+# Render `views` (an iterable of dictionaries with the keys `FIELDS`) into the directory
+# `output`, with `workers` processes (`None` uses every core). Views whose PNG is up to date
+# are skipped unless `force` is `True`. `report` is called with a line for every view as
+# soon as it is done. Returns the numbers of views rendered, skipped and failed.
+
+    os.makedirs(output, exist_ok = True)
+    workers = os.cpu_count() if workers is None else int(workers)
+    pool = mandelbrot.get_pool(workers)
+    colouring = colouring_source()
+    rendered = skipped = failed = 0
+    running = {}
+
+    def collect(done):
+
+        nonlocal rendered, failed
+
+        for future in done:
+            name = running.pop(future)
+            try:
+                seconds = future.result()
+            except Exception as error:
+                failed += 1
+                report(f'failed {name}: {error}')
+            else:
+                rendered += 1
+                report(f'rendered {name} in {seconds:.2f} s')
+
+    for view in views:
+
+        path = os.path.join(output, f"{view['name']}.png")
+        view_signature = signature(view, colouring)
+
+        if not force and up_to_date(path, view_signature):
+            skipped += 1
+            report(f"skipped {view['name']} (up to date)")
+            continue
+
+        if len(running) >= workers * IN_FLIGHT_PER_WORKER:
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+            collect(done)
+
+        running[pool.submit(_render_view, view, path, view_signature)] = view['name']
+
+    collect(wait(running).done)
+
+    return rendered, skipped, failed
+
+def main(arguments = None):
+
+    parser = argparse.ArgumentParser(description = 'Render saved Mandelbrot views to PNG.')
+    parser.add_argument('views', nargs = '+', help = 'images.txt-format, .json or .csv files of views')
+    parser.add_argument('--output', default = 'images', help = 'directory to write the images to')
+    parser.add_argument('--workers', type = int, default = None, help = 'number of processes (default: every core)')
+    parser.add_argument('--force', action = 'store_true', help = 'render views that are up to date too')
+    arguments = parser.parse_args(arguments)
+
+    views = (view for path in arguments.views for view in read_views(path))
+    rendered, skipped, failed = render_views(
+        views, arguments.output, arguments.workers, arguments.force,
+        lambda line: print(line, flush = True)
+        )
+    print(f'{rendered} rendered, {skipped} up to date, {failed} failed')
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+from decimal import Decimal
+import numpy as np
+from mandelbrot import EscapeData
+
+STORE_PATH = 'zooms.sqlite3'
+IMAGES_DIRECTORY = 'images'
+
+# Saved zooms are indexed by name in an SQLite database. Each record holds the parameters of
+# the zoom as they are written to `images.txt` (the coordinates as strings, so that deep zooms
+# keep every digit) and, when it was saved from the explorer, the escape data of the zoom is
+# kept next to its image as `images/<name>.npz`, so opening it again is only a load and its
+# colouring can be changed without iterating.
+
+def save_escape_data(data, path):
+# Write `data` to the `.npz` file `path`. The state needed to continue the iteration is kept
+# if `data` has it.
+
+    arrays = {
+        'real_axis': data.real_axis, 'imag_axis': data.imag_axis,
+        'bailout_radius': data.bailout_radius, 'steps': data.steps,
+        'iterations': data.iterations, 'abs_z': data.abs_z, 'abs_dz': data.abs_dz,
+        'interior': data.interior, 'skip_interior': data.skip_interior,
+        'detect_cycles': data.detect_cycles, 'saved_iterations': data.saved_iterations
+        }
+
+    if data.resumable():
+        arrays.update(active_index = data.active_index, active_z = data.active_z, active_dz = data.active_dz)
+
+    if data.centre is not None:
+        arrays['centre'] = np.array([str(i) for i in data.centre])
+    # Strings, to keep every digit of the reference of a deep zoom.
+
+    with open(path, 'wb') as file:
+        np.savez(file, **arrays)
+    # Uncompressed, since the escape data is there to be loaded quickly.
+
+def load_escape_data(path):
+# Read escape data written by `save_escape_data`.
+
+    with np.load(path) as arrays:
+
+        data = EscapeData(
+            arrays['real_axis'], arrays['imag_axis'], int(arrays['bailout_radius']),
+            int(arrays['steps']), arrays['iterations'], arrays['abs_z'], arrays['abs_dz'],
+            arrays['interior']
+            )
+        data.skip_interior = bool(arrays['skip_interior'])
+        data.detect_cycles = bool(arrays['detect_cycles'])
+        data.saved_iterations = int(arrays['saved_iterations'])
+
+        if 'active_index' in arrays:
+            data.active_index = arrays['active_index']
+            data.active_z = arrays['active_z']
+            data.active_dz = arrays['active_dz']
+
+        if 'centre' in arrays:
+            data.centre = tuple(Decimal(str(i)) for i in arrays['centre'])
+
+    return data
+
+class ZoomStore:
+# The saved zooms in the SQLite database `path`, whose images and escape data are kept in
+# `directory`.
+
+    def __init__(self, path = STORE_PATH, directory = IMAGES_DIRECTORY):
+
+        self.directory = directory
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS zooms ('
+            'name TEXT PRIMARY KEY, real_start TEXT, real_end TEXT, imag_end TEXT, '
+            'imag_start TEXT, height INTEGER, bailout_radius INTEGER, steps INTEGER, mode TEXT, '
+            'has_data INTEGER)'
+            )
+        self.connection.commit()
+
+    def close(self):
+
+        self.connection.close()
+
+    def data_path(self, name):
+
+        return os.path.join(self.directory, f'{name}.npz')
+
+    def save(self, name, view, height, escape_data = None):
+    # Save the zoom with the parameters `view` (in the order of `HistoryEntry.view`) under
+    # `name`, replacing any zoom of that name, along with its escape data if given.
+
+        real_start, real_end, imag_end, imag_start, steps, bailout_radius, mode = view
+
+        if escape_data is not None:
+            save_escape_data(escape_data, self.data_path(name))
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO zooms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (name, str(real_start), str(real_end), str(imag_end), str(imag_start),
+                    int(height), int(bailout_radius), int(steps), mode, escape_data is not None)
+                )
+
+    def import_text(self, path = 'images.txt'):
+    # Add the zooms of an `images.txt` file that are not in the store yet. They have no escape
+    # data, so they are rendered when opened.
+
+        if not os.path.exists(path):
+            return
+
+        with open(path) as file:
+            records = [line.split() for line in file if line.strip()]
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO zooms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)',
+                [record[:9] for record in records if len(record) >= 9]
+                )
+
+    def find(self, name):
+    # The parameters of the zoom called `name` (in the order of `HistoryEntry.view`) and the
+    # height it was saved with, or `None` if there is no such zoom.
+
+        row = self.connection.execute(
+            'SELECT real_start, real_end, imag_end, imag_start, steps, bailout_radius, mode, height '
+            'FROM zooms WHERE name = ?', (name,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return [Decimal(i) for i in row[:4]] + [int(row[4]), int(row[5]), row[6]], int(row[7])
+
+    def load(self, name):
+    # The escape data saved with the zoom called `name`, or `None` if it has none.
+
+        row = self.connection.execute('SELECT has_data FROM zooms WHERE name = ?', (name,)).fetchone()
+
+        if row is None or not row[0] or not os.path.exists(self.data_path(name)):
+            return None
+
+        return load_escape_data(self.data_path(name))
@@ -0,0 +1,187 @@
+import numpy as np
+from mandelbrot import EscapeData, escape_points, in_cardioid_or_bulb, plane_points
+
+SMALLEST_RECTANGLE = 6
+# Rectangles this many pixels across or fewer are no longer subdivided; the pixels inside
+# them are simply iterated.
+
+# The Mariani–Silver algorithm: https://en.wikibooks.org/wiki/Fractals/Iterations_in_the_complex_plane/Mariani-Silver_algorithm
+# Only the border of a rectangle of the image is iterated. If every pixel of the border is in
+# the set, so is every pixel inside it: the set is connected and has no holes, so nothing
+# that escapes can be surrounded by it. Otherwise the rectangle is split into four whose
+# borders are the old border and the two lines through its middle, and so on.
+# A pixel of the border only counts as in the set if that is proven: it lies in the main
+# cardioid or the period-2 bulb, or its orbit became periodic (the border is always iterated
+# with cycle detection). Pixels that merely did not escape within `steps` lie close to the
+# boundary of the set, where escaping filaments thinner than a pixel run between them.
+# The rectangles of one level of subdivision form a grid whose lines are `row_edges` and
+# `column_edges`, so the borders of every rectangle of the level are iterated together as a
+# single batch of points and each rectangle is tested and filled with whole-array operations.
+# The test only sees the pixels of the border, so an escaping filament could still cross the
+# border between two pixels proven to be in the set and be filled in, but only where two
+# parts of the interior of the set meet.
+# With `fill_escaped`, a rectangle whose border escapes in one and the same iteration is
+# filled with that iteration as well. This is the classic form of the algorithm but it is not
+# exact: such a rectangle can hide a small part of the set, and `abs_z` and `abs_dz` of the
+# pixels inside are interpolated from its left and right sides.
+
+def grid_cells(edges, size):
+# For each of `size` pixels along one axis, the index of the rectangle of the grid with the
+# lines `edges` it lies in (the rectangle before for a pixel on a line), the index of the
+# rectangle after and whether it lies on a line.
+
+    pixels = np.arange(size)
+    before = np.clip(np.searchsorted(edges, pixels, 'left') - 1, 0, len(edges) - 2)
+    after = np.clip(np.searchsorted(edges, pixels, 'right') - 1, 0, len(edges) - 2)
+
+    return before, after, before != after
+
+def border_mask(row_edges, column_edges, undecided, height, width):
+# The pixels on the borders of the `undecided` rectangles.
+
+    mask = np.zeros((height, width), dtype = bool)
+    row_before, row_after, _ = grid_cells(row_edges, height)
+    column_before, column_after, _ = grid_cells(column_edges, width)
+
+    lines = np.zeros((undecided.shape[0] + 1, undecided.shape[1]), dtype = bool)
+    lines[:-1] |= undecided
+    lines[1:] |= undecided
+    mask[row_edges] = np.logical_or(lines[:, column_before], lines[:, column_after])
+    # Each line of the grid, where the rectangle on either side of it is undecided.
+
+    lines = np.zeros((undecided.shape[0], undecided.shape[1] + 1), dtype = bool)
+    lines[:, :-1] |= undecided
+    lines[:, 1:] |= undecided
+    mask[:, column_edges] |= np.logical_or(lines[row_before], lines[row_after])
+
+    return mask
+
+def border_extremes(iterations, row_edges, column_edges):
+# The smallest and largest `iterations` on the border of each rectangle of the grid.
+
+    extremes = []
+
+    for reduce in (np.minimum, np.maximum):
+
+        rows = reduce.reduceat(iterations[row_edges], column_edges[:-1], axis = 1)
+        columns = reduce.reduceat(iterations[:, column_edges], row_edges[:-1], axis = 0)
+        corners = iterations[np.ix_(row_edges[1:], column_edges[1:])]
+        # Each side of a rectangle but its last pixel, which is on the next side, and the
+        # bottom-right corner, which is on no other side.
+
+        extremes.append(reduce.reduce([rows[:-1], rows[1:], columns[:, :-1], columns[:, 1:], corners]))
+
+    return extremes
+
+def compute_subdivided_escape_data(real_axis, imag_axis, bailout_radius, steps, workers = 1, skip_interior = False, detect_cycles = False, monitor = None, fill_escaped = False):
+# The escape data of the image with the axes `real_axis` and `imag_axis`, found by
+# subdivision instead of by iterating every pixel. The arguments are those of
+# `mandelbrot.compute_escape_data`. `saved_iterations` of the result includes the iterations
+# of the pixels that were filled in. The result cannot be continued to a larger `steps`
+# since the pixels that were filled in were never iterated.
+
+    data = EscapeData.empty(real_axis, imag_axis, bailout_radius, steps)
+    data.skip_interior = skip_interior
+    data.detect_cycles = detect_cycles
+    height, width = data.height, data.width
+
+    if height == 0 or width == 0:
+        return data
+
+    known = np.zeros((height, width), dtype = bool)
+    unproven = np.zeros((height, width), dtype = bool)
+    # The pixels that did not escape but were not proven to be in the set either.
+    leftover = np.zeros((height, width), dtype = bool)
+    # The pixels inside rectangles too small to subdivide, iterated along with the next batch.
+
+    row_edges = np.array([0, height - 1])
+    column_edges = np.array([0, width - 1])
+    undecided = np.ones((1, 1), dtype = bool)
+    # A single rectangle covering the image.
+
+    while undecided.any() or leftover.any():
+
+        todo = leftover
+        if undecided.any():
+            todo = np.logical_or(todo, border_mask(row_edges, column_edges, undecided, height, width))
+        todo[known] = False
+        known[todo] = True
+        # Pixels shared by neighbouring rectangles are only iterated once.
+
+        index = np.flatnonzero(todo)
+        c = plane_points(real_axis, imag_axis, index)
+
+        if skip_interior:
+            inside = in_cardioid_or_bulb(c)
+            data.saved_iterations += int(np.count_nonzero(inside)) * steps
+            keep = np.logical_not(inside)
+            index = index[keep]
+            c = c[keep]
+
+        active, _, _, saved = escape_points(
+            index, c, np.copy(c), np.zeros_like(c), 0, steps, data, workers, True, monitor
+            )
+        unproven.reshape(-1)[active] = True
+        if detect_cycles:
+            data.saved_iterations += saved
+        # Cycle detection does not change the escape data, so it is only counted as saving
+        # iterations when it was asked for.
+
+        if not undecided.any():
+            break
+
+        smallest, largest = border_extremes(data.iterations, row_edges, column_edges)
+        _, doubtful = border_extremes(unproven, row_edges, column_edges)
+        row_sizes = np.diff(row_edges)
+        column_sizes = np.diff(column_edges)
+        undecided[row_sizes < 2] = False
+        undecided[:, column_sizes < 2] = False
+        # Rectangles with nothing inside their border.
+
+        row_before, _, on_row_edge = grid_cells(row_edges, height)
+        column_before, _, on_column_edge = grid_cells(column_edges, width)
+        inside = np.logical_not(np.logical_or.outer(on_row_edge, on_column_edge))
+
+        def pixels(rectangles):
+        # The pixels inside `rectangles`, a mask of the rectangles of the grid.
+            return np.logical_and(rectangles[np.ix_(row_before, column_before)], inside)
+
+        filled = np.logical_and(undecided, np.logical_and(smallest == steps, np.logical_not(doubtful)))
+        data.saved_iterations += int(np.count_nonzero(pixels(filled))) * steps
+        # Every point of the border is in the set, so the pixels inside keep the escape data
+        # of points in the set.
+
+        if fill_escaped:
+            uniform = np.logical_and(undecided, np.logical_and(smallest == largest, smallest < steps))
+            mask = pixels(uniform)
+            rows, columns = np.nonzero(mask)
+            data.iterations[mask] = smallest[row_before[rows], column_before[columns]]
+            data.interior[mask] = False
+            data.saved_iterations += int(np.sum(data.iterations[mask] + 1))
+
+            left = column_edges[column_before[columns]]
+            right = column_edges[column_before[columns] + 1]
+            share = (columns - left) / (right - left)
+            for values in (data.abs_z, data.abs_dz):
+                values[mask] = values[rows, left] + (values[rows, right] - values[rows, left]) * share
+
+            filled = np.logical_or(filled, uniform)
+
+        known[pixels(filled)] = True
+        undecided[filled] = False
+
+        small = np.logical_and(undecided, np.logical_or.outer(row_sizes <= SMALLEST_RECTANGLE, column_sizes <= SMALLEST_RECTANGLE))
+        leftover = pixels(small)
+        undecided[small] = False
+
+        new_row_edges = np.union1d(row_edges, (row_edges[:-1] + row_edges[1:]) // 2)
+        new_column_edges = np.union1d(column_edges, (column_edges[:-1] + column_edges[1:]) // 2)
+        undecided = undecided[np.ix_(
+            np.searchsorted(row_edges, new_row_edges[:-1], 'right') - 1,
+            np.searchsorted(column_edges, new_column_edges[:-1], 'right') - 1
+            )]
+        row_edges, column_edges = new_row_edges, new_column_edges
+        # Split every rectangle into four through its middle; the new rectangles are
+        # undecided if the one they split is.
+
+    return data
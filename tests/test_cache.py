@@ -0,0 +1,15 @@
+from decimal import Decimal
+from cache import cache_key
+
+def test_equal_bounds_share_a_key():
+
+    assert cache_key((Decimal('-2'), -2.0, '-2.00', 1), 100, 1024, 512) == cache_key(('-2', '-2', '-2', '1.0'), 100, 1024, 512)
+
+def test_deep_bounds_differing_past_28_digits_have_different_keys():
+
+    first = '-0.74364388703715870475219150611111111'
+    second = '-0.74364388703715870475219150611111112'
+    # 35 significant digits, the same for the first 34.
+
+    assert cache_key((first, 1, 0, 1), 100, 1024, 512) != cache_key((second, 1, 0, 1), 100, 1024, 512)
+    assert cache_key((first + '000', 1, 0, 1), 100, 1024, 512) == cache_key((first, 1, 0, 1), 100, 1024, 512)
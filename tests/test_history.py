@@ -0,0 +1,43 @@
+import mandelbrot
+from history import History, HistoryEntry, escape_data_nbytes
+
+def entry(number):
+
+    data = mandelbrot.compute_escape_data(-2, 1, -1, 1, 60, 1024, 64)
+
+    return HistoryEntry([number], mandelbrot.colour_escape_data(data, 'grayscale'), data)
+
+def tiers(history):
+
+    return ''.join('D' if entry.decoded is not None else 'C' if entry.compressed is not None else '-' for entry in history.previous)
+
+def test_entries_are_compressed_before_any_is_reduced_to_coordinates():
+
+    decoded = entry(0).nbytes()
+    history = History(3 * decoded)
+
+    for number in range(10):
+        history.push_previous(entry(number))
+
+    assert '-' not in tiers(history) and tiers(history) == ''.join(sorted(tiers(history)))
+    assert tiers(history).startswith('C') and tiers(history).endswith('DD')
+    # Compressed furthest first, and none reduced to coordinates yet.
+    assert history.nbytes() <= history.budget
+
+    compressed = history.previous[0].nbytes()
+    history.budget = decoded + 3 * compressed
+    history.fit()
+
+    assert tiers(history) == ''.join(sorted(tiers(history))) and tiers(history).startswith('-')
+    assert tiers(history).endswith('CCCD')
+    # The oldest keep only their coordinates and the closest stays decoded.
+
+def test_escape_data_shared_by_entries_is_counted_once():
+
+    first = entry(0)
+    cut = mandelbrot.truncate_escape_data(first.escape_data, 32)
+    history = History()
+    history.push_previous(first)
+    history.push_previous(HistoryEntry([1], first.decoded, cut))
+
+    assert history.nbytes() == 2 * first.decoded.nbytes + escape_data_nbytes(cut)
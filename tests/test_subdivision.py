@@ -0,0 +1,18 @@
+import pytest
+import mandelbrot
+
+VIEWS = {
+    'default': ('-2', '1', '1', '-1'),
+    'seahorse_valley': ('-0.7575', '-0.7375', '0.1075', '0.0925'),
+    'cardioid_interior': ('-0.3', '-0.1', '0.075', '-0.075'),
+    }
+# real_start, real_end, imag_end, imag_start, in the order `main.py` passes them.
+
+@pytest.mark.parametrize('algorithm', ['subdivision', 'approximate_subdivision'])
+@pytest.mark.parametrize('view', VIEWS)
+def test_subdivision_matches_escape_time(view, algorithm):
+# `cross_check` raises `RuntimeError` if the algorithm differs from iterating every pixel.
+
+    data = mandelbrot.compute_escape_data(*VIEWS[view], 120, 1024, 512, algorithm = algorithm, cross_check = True)
+
+    assert data.height == 120
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import tiles
+
+SLOW_STEPS = 2 ** 16
+# A budget large enough that a tile along the boundary of the set is still rendering when
+# the other requests for it arrive.
+
+@pytest.fixture(scope = 'module')
+def server():
+# A `TileServer` listening on a port chosen by the system, on an event loop of its own.
+
+    tile_server = tiles.TileServer(workers = 2, max_pending = 3)
+    loop = asyncio.new_event_loop()
+    listening = threading.Event()
+    ports = []
+
+    def ready(port):
+        ports.append(port)
+        listening.set()
+
+    task = loop.create_task(tile_server.serve('127.0.0.1', 0, ready))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target = run, daemon = True)
+    thread.start()
+    assert listening.wait(30)
+
+    yield tile_server, ports[0]
+
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(30)
+
+def get(port, path):
+# The status, headers and body of a GET of `path`.
+
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout = 300) as reply:
+            return reply.status, reply.headers, reply.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, error.read()
+
+def statistics(port):
+
+    return json.loads(get(port, '/stats')[2])
+
+def get_together(port, paths):
+# GET every one of `paths` at the same time.
+
+    start = threading.Barrier(len(paths))
+
+    def request(path):
+        start.wait()
+        return get(port, path)
+
+    with ThreadPoolExecutor(len(paths)) as executor:
+        return list(executor.map(request, paths))
+
+def test_concurrent_requests_for_a_tile_render_it_once(server):
+
+    _, port = server
+    before = statistics(port)
+    replies = get_together(port, [f'/2/1/1.png?steps={SLOW_STEPS}'] * 6)
+    after = statistics(port)
+
+    assert [status for status, _, _ in replies] == [200] * 6
+    assert len({body for _, _, body in replies}) == 1
+    assert after['renders'] - before['renders'] == 1
+    assert after['coalesced'] - before['coalesced'] == 5
+
+def test_a_tile_rendered_before_is_a_cache_hit(server):
+
+    _, port = server
+    status, headers, body = get(port, '/0/0/0.png')
+    hits = statistics(port)['hits']
+
+    assert status == 200 and headers['Content-Type'] == 'image/png'
+    assert body.startswith(b'\x89PNG')
+    assert get(port, '/0/0/0.png')[2] == body
+    assert statistics(port)['hits'] == hits + 1
+
+def test_too_many_tiles_rendering_are_refused(server):
+
+    _, port = server
+    replies = get_together(port, [f'/3/{x}/3.png?steps={SLOW_STEPS + 1}' for x in range(8)])
+    refused = [headers for status, headers, _ in replies if status == 503]
+
+    assert len(refused) == 8 - 3
+    assert all(headers['Retry-After'] == str(tiles.RETRY_AFTER) for headers in refused)
+    assert all(status == 200 for status, _, _ in replies if status != 503)
+
+@pytest.mark.parametrize('path, status', [
+    ('/x/0/0.png', 400),
+    ('/0/0/0.png?steps=many', 400),
+    ('/0/0/0.png?steps=0', 400),
+    ('/0/0/0.png?mode=nope', 400),
+    ('/-1/0/0.png', 404),
+    ('/3/8/0.png', 404),
+    ('/0/0/-1.png', 404),
+    ('/nothing', 404),
+    ])
+def test_bad_requests_are_rejected(server, path, status):
+
+    assert get(server[1], path)[0] == status
@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+from collections import OrderedDict
+from decimal import Decimal, localcontext
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from PIL import Image
+import mandelbrot
+from budget import probe_steps
+from perturbation import decimal_digits
+
+# Serve the set as map tiles over HTTP on this machine, for web map viewers, e.g.
+#     python tiles.py --port 8000
+# and point the viewer at http://127.0.0.1:8000/{z}/{x}/{y}.png (optionally with
+# `?mode=classic` and `?steps=1024`). Tiles are addressed like the tiles of web maps: zoom
+# level z covers the square `WORLD` with 2 ^ z by 2 ^ z tiles, x counting to the right and y
+# downwards, so every level halves the width of a tile. Tiles render on the process pool of
+# `mandelbrot.get_pool`, in float64 or with perturbation, as deep as the viewer zooms.
+# Requests for a tile that is already rendering wait for that render instead of starting
+# another, rendered tiles are kept as PNGs within `TILE_CACHE_BUDGET` bytes, least recently
+# used first out, and once `workers` * `PENDING_PER_WORKER` tiles are waiting to render, new
+# ones are refused with 503 and a Retry-After header rather than queueing without bound.
+# `/stats` reports the counters of the server as JSON.
+
+TILE_SIZE = 256
+# The height and width of a tile, in pixels.
+WORLD = (Decimal('-2.5'), Decimal('2'), Decimal(4))
+# The left edge, top edge and width of the square zoom level 0 covers.
+MAX_ZOOM = 128
+BAILOUT_RADIUS = 1024
+TILE_CACHE_BUDGET = 64 * 2 ** 20
+# The number of bytes the PNGs of the tiles kept in memory may take up.
+PENDING_PER_WORKER = 8
+RETRY_AFTER = 1
+# The seconds a refused viewer is asked to wait before asking again.
+REQUEST_TIMEOUT = 10
+# The seconds a connection may take to send its request.
+HOST = '127.0.0.1'
+PORT = 8000
+
+def tile_bounds(z, x, y):
+# The bounds (real_start, real_end, imag_start, imag_end) of the centres of the outermost
+# pixels of tile (`z`, `x`, `y`), as `Decimal`s with enough digits for its zoom. The top row
+# of the tile is `imag_end`. Neighbouring tiles are one pixel apart, so none is repeated.
+
+    left, top, width = WORLD
+
+    with localcontext() as context:
+        context.prec = decimal_digits(width / 2 ** z / TILE_SIZE)
+        side = width / 2 ** z
+        half_pixel = side / (2 * TILE_SIZE)
+        real_start = left + x * side + half_pixel
+        imag_end = top - y * side - half_pixel
+
+        return real_start, real_start + side - 2 * half_pixel, imag_end - side + 2 * half_pixel, imag_end
+
+def tile_steps(z):
+# The budget of the tiles of zoom level `z` when the viewer does not ask for one: the same
+# for every tile of a level, so that the colours of neighbouring tiles match.
+
+    return probe_steps(z)
+
+def _render_tile(z, x, y, steps, mode):
+# Run in a worker process. Render tile (`z`, `x`, `y`) and return it as a PNG.
+
+    real_start, real_end, imag_start, imag_end = tile_bounds(z, x, y)
+    data = mandelbrot.compute_escape_data(
+        real_start, real_end, imag_start, imag_end, TILE_SIZE, BAILOUT_RADIUS, steps,
+        skip_interior = True, detect_cycles = True
+        )
+    pixels = mandelbrot.escape_hsv(data.iterations, data.abs_z, data.abs_dz, data.interior, steps, mode)
+
+    if mode == 'distance_estimator':
+        pixels[..., 0] = np.clip(pixels[..., 0] / float(WORLD[2] / 2 ** z), 0, 1)
+    # Normalized by the width of the tile rather than by the largest distance in it, as
+    # `colour_escape_data` does for a whole image, so that neighbouring tiles match.
+
+    file = io.BytesIO()
+    Image.fromarray(mandelbrot.hsv_to_image(pixels)).save(file, format = 'PNG')
+
+    return file.getvalue()
+
+def response(status, body = b'', content_type = 'text/plain', headers = ()):
+# An HTTP response with the status `status`, as bytes. The connection closes after it.
+
+    status = HTTPStatus(status)
+    lines = [
+        f'HTTP/1.1 {status.value} {status.phrase}', f'Content-Type: {content_type}',
+        f'Content-Length: {len(body)}', 'Connection: close', *headers
+        ]
+
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+class TileServer:
+# The tiles and the renders in flight of one server. Only used from the thread running its
+# event loop.
+
+    def __init__(self, workers = None, cache_budget = TILE_CACHE_BUDGET, max_pending = None):
+
+        self.workers = os.cpu_count() if workers is None else int(workers)
+        self.pool = mandelbrot.get_pool(self.workers)
+        self.cache_budget = cache_budget
+        self.max_pending = self.workers * PENDING_PER_WORKER if max_pending is None else max_pending
+        self.tiles = OrderedDict()
+        # The PNGs of the tiles, from least to most recently used.
+        self.nbytes = 0
+        self.in_flight = {}
+        # The renders running or waiting for a worker, by tile.
+        self.counts = dict.fromkeys(('requests', 'hits', 'renders', 'coalesced', 'refused', 'errors'), 0)
+
+    def remember(self, key, png):
+    # Keep the tile `png` as the most recently used and drop the least recently used tiles
+    # until they fit `cache_budget`.
+
+        if len(png) > self.cache_budget:
+            return
+
+        self.tiles[key] = png
+        self.nbytes += len(png)
+
+        while self.nbytes > self.cache_budget:
+            _, dropped = self.tiles.popitem(last = False)
+            self.nbytes -= len(dropped)
+
+    async def render(self, key):
+
+        try:
+            png = await asyncio.get_running_loop().run_in_executor(self.pool, partial(_render_tile, *key))
+            self.remember(key, png)
+            return png
+        finally:
+            del self.in_flight[key]
+
+    async def tile(self, z, x, y, steps, mode):
+    # The PNG of a tile, or `None` if too many tiles are waiting to render to take another.
+
+        key = (z, x, y, steps, mode)
+        self.counts['requests'] += 1
+
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            self.counts['hits'] += 1
+            return self.tiles[key]
+
+        task = self.in_flight.get(key)
+
+        if task is not None:
+            self.counts['coalesced'] += 1
+
+        elif len(self.in_flight) >= self.max_pending:
+            self.counts['refused'] += 1
+            return None
+
+        else:
+            task = self.in_flight[key] = asyncio.ensure_future(self.render(key))
+            self.counts['renders'] += 1
+
+        return await asyncio.shield(task)
+        # A viewer that goes away does not cancel the render the others are waiting for.
+
+    def statistics(self):
+
+        return {**self.counts, 'tiles': len(self.tiles), 'nbytes': self.nbytes, 'in_flight': len(self.in_flight)}
+
+    async def respond(self, target):
+    # The response to a GET of `target`, the path and query of the request.
+
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if url.path == '/stats':
+            return response(200, json.dumps(self.statistics()).encode(), 'application/json')
+
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 3 or not parts[2].endswith('.png'):
+            return response(404, b'not found\n')
+
+        try:
+            z, x, y = int(parts[0]), int(parts[1]), int(parts[2][:-4])
+        except ValueError:
+            return response(400, b'tile coordinates must be integers\n')
+
+        if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+            return response(404, b'no such tile\n')
+
+        try:
+            steps = int(query['steps']) if 'steps' in query else tile_steps(z)
+        except ValueError:
+            return response(400, b'steps must be an integer\n')
+
+        mode = query.get('mode', 'distance_estimator')
+        if mode not in mandelbrot.MODES or steps < 1:
+            return response(400, f"mode must be one of {', '.join(mandelbrot.MODES)} and steps positive\n".encode())
+
+        try:
+            png = await self.tile(z, x, y, steps, mode)
+        except Exception as error:
+            self.counts['errors'] += 1
+            return response(500, f'render failed: {error}\n'.encode())
+
+        if png is None:
+            return response(503, b'too many tiles rendering\n', headers = [f'Retry-After: {RETRY_AFTER}'])
+
+        return response(200, png, 'image/png', ['Cache-Control: max-age=86400'])
+
+    async def handle(self, reader, writer):
+    # Serve one connection: read a request, answer it and close.
+
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_TIMEOUT)
+            method, target, _ = request.split(b'\r\n', 1)[0].decode('latin-1').split(' ', 2)
+
+            if method != 'GET':
+                writer.write(response(405, b'only GET is supported\n', headers = ['Allow: GET']))
+            else:
+                writer.write(await self.respond(target))
+
+            await writer.drain()
+
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        # A connection that closed early or sent garbage is dropped.
+
+        finally:
+            writer.close()
+
+    async def serve(self, host = HOST, port = PORT, ready = None):
+    # Serve on `host` and `port` until cancelled. `ready` is called with the port once the
+    # server listens, which is chosen by the system if `port` is 0.
+
+        server = await asyncio.start_server(self.handle, host, port)
+
+        async with server:
+            if ready is not None:
+                ready(server.sockets[0].getsockname()[1])
+            await server.serve_forever()
+
+def main(arguments = None):
+
+    parser = argparse.ArgumentParser(description = 'Serve Mandelbrot map tiles over HTTP.')
+    parser.add_argument('--host', default = HOST, help = 'address to listen on (default: this machine only)')
+    parser.add_argument('--port', type = int, default = PORT)
+    parser.add_argument('--workers', type = int, default = None, help = 'number of processes (default: every core)')
+    parser.add_argument('--cache-budget', type = int, default = TILE_CACHE_BUDGET, help = 'bytes of tiles to keep in memory')
+    parser.add_argument('--max-pending', type = int, default = None, help = f'tiles waiting to render before refusing more (default: {PENDING_PER_WORKER} per worker)')
+    arguments = parser.parse_args(arguments)
+
+    server = TileServer(arguments.workers, arguments.cache_budget, arguments.max_pending)
+
+    try:
+        asyncio.run(server.serve(
+            arguments.host, arguments.port,
+            lambda port: print(f'serving tiles on http://{arguments.host}:{port}/{{z}}/{{x}}/{{y}}.png', flush = True)
+            ))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())